@@ -0,0 +1,125 @@
+""" بنچمارک end-to-end برای SEOService.generate_title_for_all بدون شبکه و SQL Server واقعی
+
+نمونه:
+    python -m benchmarks.bench_pipeline --rows 1000 10000 --latency 0.05 --concurrency 16 --backends 4
+"""
+import argparse
+import logging
+import os
+import resource
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+
+from benchmarks.fake_database import FakeDatabase
+from benchmarks.fake_gradio_server import FakeGradioServer
+from services.llm_service import QService
+from services.metrics import REGISTRY
+from services.provider_pool import QServicePool
+from services.rate_limiter import TokenBucket
+from services.seo_service import SEOService
+from services.title_writer import TitleWriteBuffer
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+def run_once(rows, server, args):
+    """ اجرای یک بار pipeline روی rows ردیف و برگرداندن آمار آن """
+    db = FakeDatabase(rows=rows, query_latency=args.db_latency)
+    q_service = QServicePool([
+        QService(session_hash=f"bench-{uuid.uuid4().hex[:8]}-{i}", base_url=server.url, max_attempts=3,
+                 rate_limiter=TokenBucket(rate=args.rate, capacity=args.rate, max_rate=args.rate))
+        for i in range(args.backends)
+    ])
+    writer = TitleWriteBuffer(db) if args.write_behind else None
+    service = SEOService(db=db, q_service=q_service, delay=0, concurrency=args.concurrency,
+                         writer=writer, candidates=args.candidates)
+
+    latencies = []
+    lock = threading.Lock()
+    optimize = service._optimize_title
+
+    def timed_optimize(*a, **kw):
+        started = time.perf_counter()
+        try:
+            return optimize(*a, **kw)
+        finally:
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+
+    service._optimize_title = timed_optimize
+    requests_before = server.requests
+    REGISTRY.reset()
+
+    if args.trace_malloc:
+        tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        service.generate_title_for_all()
+    finally:
+        elapsed = time.perf_counter() - started
+        if args.trace_malloc:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        else:
+            # ru_maxrss در لینوکس بر حسب کیلوبایت است
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        service.close()
+        db.disconnect()
+
+    return {
+        "rows": rows,
+        "seconds": elapsed,
+        "rows_per_sec": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "peak_mb": peak / 1024 / 1024,
+        "http_requests": server.requests - requests_before,
+        "db_reads": db.reads,
+        "db_writes": db.writes
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline throughput benchmark for the title pipeline")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--latency", type=float, default=0.05, help="fake LLM latency per prompt (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of POSTs answered with 503")
+    parser.add_argument("--generating-steps", type=int, default=5)
+    parser.add_argument("--db-latency", type=float, default=0.0, help="simulated DB round trip (s)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--backends", type=int, default=4)
+    parser.add_argument("--candidates", type=int, default=1)
+    parser.add_argument("--rate", type=float, default=10000.0, help="client token-bucket rate per backend")
+    parser.add_argument("--write-behind", action="store_true", help="use TitleWriteBuffer for DB updates")
+    parser.add_argument("--trace-malloc", action="store_true",
+                        help="report Python heap peak via tracemalloc (slow) instead of process peak RSS")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    # SEOService فایل‌های نتایج را در seo_output/ می‌نویسد؛ بنچمارک در پوشه‌ی موقت اجرا می‌شود
+    workdir = tempfile.mkdtemp(prefix="seo-bench-")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        with FakeGradioServer(latency=args.latency, error_rate=args.error_rate,
+                              generating_steps=args.generating_steps) as server:
+            print(f"{'rows':>8} {'sec':>8} {'rows/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+                  f"{'mem MB':>8} {'http':>8} {'db r/w':>10}")
+            for rows in args.rows:
+                r = run_once(rows, server, args)
+                print(f"{r['rows']:>8} {r['seconds']:>8.2f} {r['rows_per_sec']:>9.1f} {r['p50'] * 1000:>8.1f} "
+                      f"{r['p95'] * 1000:>8.1f} {r['p99'] * 1000:>8.1f} {r['peak_mb']:>8.1f} "
+                      f"{r['http_requests']:>8} {r['db_reads']:>4}/{r['db_writes']:<5}")
+    finally:
+        os.chdir(cwd)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import random
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from services.purecontent_query import iter_keyset_pages, purecontent_filters
+
+class FakeDatabase:
+    """ جایگزین محلی SQLServerDatabase روی SQLite در حافظه با همان رابط
+
+    ردیف‌های TblPureContent به صورت مصنوعی ساخته می‌شوند؛ query_latency (ثانیه)
+    تأخیر رفت‌وبرگشت شبکه تا SQL Server را برای هر فراخوانی شبیه‌سازی می‌کند.
+    """
+    PURECONTENT_COLUMNS = ("Id", "Title", "Description", "ContentCategoryId", "ContentLanguageId")
+    MODIFIED_COLUMN = "ModifiedDate"
+
+    TOPICS = ["VR headsets", "content marketing", "home workouts", "electric cars", "coffee brewing",
+              "remote work", "personal finance", "machine learning", "travel photography", "urban gardening"]
+    PATTERNS = ["The Future of {}", "{} for Beginners", "Understanding {} in 2025",
+                "Why {} Matters Today", "Final Title: A Deep Dive into {}"]
+
+    def __init__(self, rows=1000, query_latency=0.0, seed=42, description_size=2000):
+        self.query_latency = query_latency
+        self.reads = 0
+        self.writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(":memory:", check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE TblPureContent (Id INTEGER PRIMARY KEY, Title TEXT, Description TEXT,"
+            " ContentCategoryId INTEGER, ContentLanguageId INTEGER, ModifiedDate TIMESTAMP)"
+        )
+        rng = random.Random(seed)
+        description = "x" * description_size
+        modified = datetime(2025, 1, 1)
+        self._conn.executemany(
+            "INSERT INTO TblPureContent VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                (i, rng.choice(self.PATTERNS).format(rng.choice(self.TOPICS)) + f" #{i}", description,
+                 rng.randint(1, 10), 2, modified + timedelta(minutes=i))
+                for i in range(1, rows + 1)
+            )
+        )
+        self._conn.execute(
+            "CREATE TABLE TblTitleWorkLease (RunId TEXT NOT NULL, ContentId INTEGER NOT NULL, Owner TEXT,"
+            " LeaseExpiresAt REAL, CompletedAt REAL, PRIMARY KEY (RunId, ContentId))"
+        )
+        self._conn.commit()
+
+    def connect(self):
+        pass
+
+    def disconnect(self):
+        self._conn.close()
+
+    def test_table_exists(self, table_name):
+        return table_name == "TblPureContent"
+
+    def select(self, query, params=None):
+        with self._lock:
+            self._wait()
+            self.reads += 1
+            return self._conn.execute(query, params or []).fetchall()
+
+    def get_all_purecontents(self):
+        return self.select(
+            "SELECT Id, Title, Description, ContentCategoryId, ContentLanguageId FROM TblPureContent"
+        )
+
+    def get_purecontent_with_null_title(self):
+        return self.select(
+            "SELECT Id, Description, ContentLanguageId FROM TblPureContent WHERE Title IS NULL OR Title = ''"
+        )
+
+    def iter_purecontents(self, columns=PURECONTENT_COLUMNS, page_size=500, start_after=0, limit=None, **filters):
+        columns = ["Id"] + [c for c in columns if c != "Id"]
+        clauses, filter_params = purecontent_filters(self.MODIFIED_COLUMN, **filters)
+        query = (
+            f"SELECT {', '.join(columns)} FROM TblPureContent"
+            f" WHERE {' AND '.join(['Id > ?'] + clauses)} ORDER BY Id LIMIT ?"
+        )
+        return iter_keyset_pages(
+            lambda size, last_id: self.select(query, [last_id, *filter_params, size]),
+            page_size, start_after, limit
+        )
+
+    def update_pure_content(self, content_id, title):
+        self.update_pure_contents([(content_id, title)])
+
+    def update_pure_contents(self, updates):
+        with self._lock:
+            self._wait()
+            self.writes += 1
+            self._conn.executemany(
+                "UPDATE TblPureContent SET Title = ? WHERE Id = ?",
+                [(title, content_id) for content_id, title in updates]
+            )
+            self._conn.commit()
+
+    def ensure_work_lease_table(self):
+        pass
+
+    def seed_work_leases(self, run_id, **filters):
+        clauses, filter_params = purecontent_filters(self.MODIFIED_COLUMN, alias="p.", **filters)
+        with self._lock:
+            self._wait()
+            self.writes += 1
+            self._conn.execute(
+                "INSERT OR IGNORE INTO TblTitleWorkLease (RunId, ContentId)"
+                " SELECT ?, p.Id FROM TblPureContent p WHERE p.Title IS NOT NULL AND p.Title <> ''"
+                + "".join(f" AND {clause}" for clause in clauses),
+                [run_id, *filter_params]
+            )
+            self._conn.commit()
+
+    def claim_work(self, run_id, owner, batch_size=10, lease_seconds=900):
+        now = time.time()
+        with self._lock:
+            self._wait()
+            self.writes += 1
+            ids = [row[0] for row in self._conn.execute(
+                "SELECT ContentId FROM TblTitleWorkLease WHERE RunId = ? AND CompletedAt IS NULL"
+                " AND (LeaseExpiresAt IS NULL OR LeaseExpiresAt < ?) ORDER BY ContentId LIMIT ?",
+                (run_id, now, batch_size)
+            )]
+            self._conn.executemany(
+                "UPDATE TblTitleWorkLease SET Owner = ?, LeaseExpiresAt = ? WHERE RunId = ? AND ContentId = ?",
+                [(owner, now + lease_seconds, run_id, content_id) for content_id in ids]
+            )
+            self._conn.commit()
+        if not ids:
+            return []
+        return self.select(
+            f"SELECT Id, Title, ContentLanguageId FROM TblPureContent WHERE Id IN ({', '.join('?' * len(ids))})"
+            " ORDER BY Id", ids
+        )
+
+    def complete_work(self, run_id, owner, content_ids):
+        content_ids = list(content_ids)
+        if not content_ids:
+            return
+        with self._lock:
+            self._wait()
+            self.writes += 1
+            self._conn.execute(
+                "UPDATE TblTitleWorkLease SET CompletedAt = ?, LeaseExpiresAt = NULL"
+                f" WHERE RunId = ? AND Owner = ? AND ContentId IN ({', '.join('?' * len(content_ids))})",
+                [time.time(), run_id, owner, *content_ids]
+            )
+            self._conn.commit()
+
+    def _wait(self):
+        if self.query_latency:
+            time.sleep(self.query_latency)
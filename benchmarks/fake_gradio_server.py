@@ -0,0 +1,164 @@
+import json
+import queue
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+class _QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # قطع اتصال keep-alive توسط کلاینت در پایان اجرا خطا نیست
+        pass
+
+
+class FakeGradioServer:
+    """ سرور محلی که /run/predict، /queue/join و stream SSE /queue/data را مثل Space تقلید می‌کند
+
+    latency (ثانیه) زمان تولید هر پاسخ، error_rate احتمال خطای 503 برای هر POST،
+    و generating_steps تعداد پیام‌های process_generating پیش از پیام پایانی است.
+    """
+    def __init__(self, latency=0.05, error_rate=0.0, generating_steps=5, host="127.0.0.1", port=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.generating_steps = generating_steps
+        self.requests = 0
+        self.errors = 0
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._server = _QuietServer((host, port), self._handler())
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-gradio", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _session(self, session_hash):
+        with self._lock:
+            return self._sessions.setdefault(session_hash, queue.Queue())
+
+    def answer(self, prompt):
+        """ پاسخ ساختگی مدل: یک JSON با عنوان بهینه‌شده بر اساس عنوان داخل prompt """
+        title = prompt.rsplit("\n", 1)[-1].strip() if "\n" in prompt else prompt
+        for marker in ("\nTitle:\n", "\nعنوان:\n"):
+            if marker in prompt:
+                title = prompt.split(marker, 1)[1].split("\n", 1)[0].strip()
+        optimized = f"How to {title[:1].lower()}{title[1:]}: a complete guide"
+        return json.dumps({"original_title": title, "optimized_title": optimized, "score": 8}, ensure_ascii=False)
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, payload, status=200, headers=None):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                with server._lock:
+                    server.requests += 1
+                    failed = random.random() < server.error_rate
+                    if failed:
+                        server.errors += 1
+                if failed:
+                    return self._send_json({"detail": "overloaded"}, status=503, headers={"Retry-After": "0"})
+
+                path = urlparse(self.path).path
+                if path == "/run/predict":
+                    return self._send_json({"data": [], "is_generating": False, "duration": 0.0})
+                if path == "/queue/join":
+                    event_id = uuid.uuid4().hex
+                    text = body["data"][0][0][0]["text"]
+                    server._session(body["session_hash"]).put((event_id, text))
+                    return self._send_json({"event_id": event_id})
+                self._send_json({"detail": "Not Found"}, status=404)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path != "/queue/data":
+                    return self._send_json({"detail": "Not Found"}, status=404)
+                pending = server._session(parse_qs(url.query)["session_hash"][0])
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                write_lock = threading.Lock()
+                workers = []
+                try:
+                    while True:
+                        try:
+                            event_id, prompt = pending.get(timeout=0.2)
+                        except queue.Empty:
+                            workers = [w for w in workers if w.is_alive()]
+                            if workers:
+                                continue
+                            self._event({"msg": "close_stream"}, write_lock)
+                            break
+                        # eventهای هم‌زمان یک session موازی تولید می‌شوند، مثل queue واقعی
+                        worker = threading.Thread(target=self._produce, args=(event_id, prompt, write_lock), daemon=True)
+                        worker.start()
+                        workers.append(worker)
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def _produce(self, event_id, prompt, write_lock):
+                answer = server.answer(prompt)
+                steps = max(server.generating_steps, 0)
+                try:
+                    self._event({"msg": "process_starts", "event_id": event_id}, write_lock)
+                    for step in range(1, steps + 1):
+                        time.sleep(server.latency / (steps + 1))
+                        partial = answer[: len(answer) * step // (steps + 1)]
+                        self._event({"msg": "process_generating", "event_id": event_id,
+                                     "output": self._output(prompt, partial)}, write_lock)
+                    time.sleep(server.latency / (steps + 1))
+                    self._event({"msg": "process_completed", "event_id": event_id, "success": True,
+                                 "output": self._output(prompt, answer)}, write_lock)
+                except (BrokenPipeError, ConnectionResetError, ValueError):
+                    pass
+
+            @staticmethod
+            def _output(prompt, text):
+                # همان شکلی که QService._extract_output_text می‌خواند: data[0][0][1][0]["text"]
+                return {"data": [[[{"text": prompt}, [{"text": text}]]]], "is_generating": True}
+
+            def _event(self, payload, write_lock):
+                data = f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8")
+                with write_lock:
+                    self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                    self.wfile.flush()
+
+        return Handler
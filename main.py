@@ -1,7 +1,22 @@
+import argparse
 import logging
+from datetime import datetime
 from services.sql_server_database import SQLServerDatabase
 from services.seo_service import SEOService  # Added SEOService import
 from services.llm_service import QService
+from services.provider_pool import QServicePool
+from services.response_cache import ResponseCache
+from services.title_writer import TitleWriteBuffer
+from services.checkpoint_store import CheckpointStore
+from services.results_store import RunHistoryStore
+from services.title_dedup import TitleDeduplicator
+from services.metrics import REGISTRY
+from services.sharded_runner import run_sharded
+
+# پورت endpoint متریک‌های Prometheus؛ None یعنی فقط فایل seo_output/metrics.prom
+METRICS_PORT = None
+# حداکثر فراخوانی LLM در هر اجرا؛ None یعنی بدون محدودیت
+LLM_CALL_BUDGET = None
 
 # تنظیمات لاگ‌گیری
 logging.basicConfig(
@@ -20,11 +35,36 @@ def setup_database_connection():
     db = SQLServerDatabase(SERVER, DATABASE, USERNAME, PASSWORD)
     return db
 
-def setup_services(db):
-    """راه‌اندازی سرویس‌ها"""
-    SESSION_HASH = "amir"
-    q_service = QService(session_hash=SESSION_HASH)
-    seo_service = SEOService(db=db, q_service=q_service)  # Now recognized as SEOService
+def setup_services(db, worker_id=None):
+    """راه‌اندازی سرویس‌ها
+
+    worker_id در اجرای shard‌شده به session hashها اضافه می‌شود؛ processهایی که session
+    مشترک دارند eventهای هم را از stream /queue/data برمی‌دارند.
+    """
+    # هر (endpoint, session_hash) یک صف جدا در Gradio دارد؛ با افزودن backend توان عملیاتی بالا می‌رود
+    BACKENDS = [
+        ("https://qwen-qwen2-5-1m-demo.hf.space", "amir"),
+        ("https://qwen-qwen2-5-1m-demo.hf.space", "amir-2"),
+        #("https://qwen-qwq-32b-preview.hf.space", "amir"),
+    ]
+    q_service = QServicePool([
+        QService(session_hash=session_hash if worker_id is None else f"{session_hash}-{worker_id}", base_url=base_url)
+        for base_url, session_hash in BACKENDS
+    ])
+    cache = ResponseCache()
+    writer = TitleWriteBuffer(db)
+    if worker_id is None:
+        checkpoint = CheckpointStore()
+        history = RunHistoryStore()
+    else:
+        # چند process روی همین فایل‌ها می‌نویسند؛ تراکنش باز نباید قفل نوشتن را نگه دارد
+        checkpoint = CheckpointStore(commit_every=1)
+        history = RunHistoryStore(commit_every=1)
+    seo_service = SEOService(
+        db=db, q_service=q_service, cache=cache, writer=writer,
+        checkpoint=checkpoint, incremental=True, concurrency=len(q_service), history=history,
+        triage=True, llm_call_budget=LLM_CALL_BUDGET, dedup=TitleDeduplicator()
+    )  # Now recognized as SEOService
     return seo_service
 
 def test_table_existence(db):
@@ -39,9 +79,93 @@ def test_table_existence(db):
         logger.error(f"❌ خطا در چک کردن جدول: {e}")
         return False
 
-def main():
+def parse_args(argv=None):
+    """خواندن آرگومان‌های خط فرمان"""
+    parser = argparse.ArgumentParser(description="SEO title optimization for TblPureContent")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="run N worker processes coordinated through dbo.TblTitleWorkLease")
+    parser.add_argument("--run-id", default=None,
+                        help="shared id of a sharded run (default: current timestamp)")
+    parser.add_argument("--join", action="store_true",
+                        help="join an existing sharded run from another host without seeding work")
+    parser.add_argument("--batch-size", type=int, default=10, help="contents claimed per lease")
+    parser.add_argument("--lease-seconds", type=int, default=900, help="lease expiry for claimed contents")
+    parser.add_argument("--lang", type=int, default=None, help="only contents with this ContentLanguageId")
+    parser.add_argument("--category", type=int, default=None, help="only contents with this ContentCategoryId")
+    parser.add_argument("--id-range", type=parse_id_range, default=None, metavar="START:END",
+                        help="only contents with START <= Id <= END (either side may be empty)")
+    parser.add_argument("--only-null-title", action="store_true",
+                        help="only contents without a title; the Description is used as the source text")
+    parser.add_argument("--since", type=datetime.fromisoformat, default=None, metavar="YYYY-MM-DD[THH:MM]",
+                        help="only contents modified since this time (column SQLServerDatabase.MODIFIED_COLUMN)")
+    parser.add_argument("--limit", type=int, default=None, help="process at most N contents")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="list the selected contents without calling the LLM or writing to the database")
+    return parser.parse_args(argv)
+
+def parse_id_range(value):
+    """تبدیل START:END به (start, end)؛ سر خالی یعنی بدون محدودیت"""
+    start, sep, end = value.partition(":")
+    if not sep:
+        raise argparse.ArgumentTypeError("expected START:END, e.g. 1000:2000 or 1000:")
+    try:
+        return (int(start) if start else None, int(end) if end else None)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid id range: {value}")
+
+def content_filters(args):
+    """فیلترهای خط فرمان به شکل آرگومان‌های services.purecontent_query.purecontent_filters"""
+    filters = {
+        "lang_id": args.lang,
+        "category_id": args.category,
+        "id_range": args.id_range,
+        "modified_since": args.since,
+    }
+    filters = {name: value for name, value in filters.items() if value is not None}
+    if args.only_null_title:
+        filters["only_null_title"] = True
+    return filters
+
+def select_contents(db, args, page_size=500):
+    """ردیف‌های انتخاب‌شده (Id, متن منبع, ContentLanguageId) با فیلترهای اعمال‌شده در SQL"""
+    # محتوای بدون عنوان از روی Description عنوان می‌گیرد
+    source = "Description" if args.only_null_title else "Title"
+    return db.iter_purecontents(
+        columns=("Id", source, "ContentLanguageId"), page_size=page_size,
+        limit=args.limit, **content_filters(args)
+    )
+
+def list_contents(db, args):
+    """نمایش ردیف‌هایی که اجرای واقعی پردازش می‌کرد (بدون LLM و بدون نوشتن)"""
+    count = 0
+    for content_id, text, lang_id in select_contents(db, args):
+        count += 1
+        logger.info(f"📝 {content_id} | lang={lang_id} | {(text or '').strip()[:80]}")
+    logger.info(f"🔎 Dry run: {count} contents selected")
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.workers:
+        # اجرای shard‌شده: هر process اتصال و سرویس‌های خودش را می‌سازد
+        if args.join and not args.run_id:
+            logger.error("❌ --join needs the --run-id of the running sharded job.")
+            return
+        if args.only_null_title or args.limit is not None or args.dry_run:
+            logger.error("❌ --only-null-title, --limit and --dry-run are not supported with --workers.")
+            return
+        run_id = args.run_id or datetime.now().strftime("%Y%m%d_%H%M%S")
+        logger.info(f"🧩 Sharded run {run_id} with {args.workers} workers...")
+        run_sharded(
+            setup_database_connection, setup_services, run_id, workers=args.workers,
+            batch_size=args.batch_size, lease_seconds=args.lease_seconds, seed=not args.join,
+            filters=content_filters(args)
+        )
+        return
+
     # راه‌اندازی و اتصال به دیتابیس
     db = setup_database_connection()
+    seo_service = None
     
     try:
         logger.info("🔌 در حال اتصال به دیتابیس...")
@@ -52,17 +176,31 @@ def main():
         if not test_table_existence(db):
             return
 
+        if args.dry_run:
+            list_contents(db, args)
+            return
+
         # راه‌اندازی سرویس‌ها
         seo_service = setup_services(db)
+        if METRICS_PORT:
+            REGISTRY.serve(METRICS_PORT)
+            logger.info(f"📊 Metrics endpoint on port {METRICS_PORT}")
 
         # شروع فرآیند بهینه‌سازی
         logger.info("🚀 شروع فرآیند بهینه‌سازی عناوین برای سئو...")
-        seo_service.generate_title_for_all()
+        contents = None
+        if content_filters(args) or args.limit is not None:
+            # فیلترها در خود کوئری اعمال می‌شوند تا فقط ردیف‌های لازم خوانده شوند
+            contents = select_contents(db, args, page_size=seo_service.page_size)
+        seo_service.generate_title_for_all(contents=contents, from_description=args.only_null_title)
 
     except Exception as e:
         logger.exception(f"❌ خطای کلی در اجرای برنامه: {e}")
 
     finally:
+        if seo_service is not None:
+            seo_service.close()
+
         # قطع ارتباط با دیتابیس
         db.disconnect()
         logger.info("🔌 ارتباط با دیتابیس قطع شد.")
@@ -0,0 +1,66 @@
+import hashlib
+import threading
+import time
+from collections import namedtuple
+from services.sqlite_store import connect_sqlite
+
+Checkpoint = namedtuple("Checkpoint", "content_id title_hash result_hash optimized_title seo_score updated_at")
+
+class CheckpointStore:
+    """ ذخیره‌ی وضعیت پردازش هر محتوا برای ادامه‌ی اجرا پس از crash و اجرای افزایشی
+
+    برای هر content_id، hash عنوان اصلی پردازش‌شده و hash/مقدار نتیجه نگه داشته می‌شود.
+    """
+    def __init__(self, path="seo_output/checkpoint.db", commit_every=50):
+        self.path = path
+        self.commit_every = commit_every
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._conn = connect_sqlite(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS checkpoints ("
+            " content_id INTEGER PRIMARY KEY,"
+            " title_hash TEXT NOT NULL,"
+            " result_hash TEXT NOT NULL,"
+            " optimized_title TEXT NOT NULL,"
+            " seo_score REAL NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def title_hash(title):
+        return hashlib.sha256((title or "").strip().encode("utf-8")).hexdigest()
+
+    def get(self, content_id):
+        """ آخرین وضعیت ثبت‌شده برای یک محتوا یا None """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content_id, title_hash, result_hash, optimized_title, seo_score, updated_at"
+                " FROM checkpoints WHERE content_id = ?", (content_id,)
+            ).fetchone()
+        return Checkpoint(*row) if row else None
+
+    def record(self, content_id, original_title, optimized_title, seo_score):
+        """ ثبت نتیجه‌ی پردازش یک محتوا """
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints"
+                " (content_id, title_hash, result_hash, optimized_title, seo_score, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (content_id, self.title_hash(original_title), self.title_hash(optimized_title),
+                 optimized_title, seo_score, time.time())
+            )
+            self._pending += 1
+            if self._pending >= self.commit_every:
+                self._conn.commit()
+                self._pending = 0
+
+    def commit(self):
+        with self._lock:
+            self._conn.commit()
+            self._pending = 0
+
+    def close(self):
+        self.commit()
+        self._conn.close()
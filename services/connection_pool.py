@@ -0,0 +1,147 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+class ConnectionPool:
+    """ pool اتصال thread-safe با حداقل/حداکثر اندازه و health check هنگام تحویل
+
+    هر thread در طول یک lease اتصال اختصاصی خودش را دارد؛ leaseهای تو در تو
+    در همان thread از همان اتصال استفاده می‌کنند.
+    """
+    def __init__(self, connect, min_size=1, max_size=8, timeout=30,
+                 health_query="SELECT 1", health_check_interval=30):
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_query = health_query
+        self.health_check_interval = health_check_interval
+        self._idle = []  # (connection, last_used)
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        for _ in range(min_size):
+            self._idle.append((self._create(), time.monotonic()))
+
+    @contextmanager
+    def lease(self):
+        """ گرفتن یک اتصال برای thread جاری و برگرداندن آن به pool در پایان """
+        held = getattr(self._local, "held", None)
+        if held is not None:
+            self._local.depth += 1
+            try:
+                yield held
+            finally:
+                self._local.depth -= 1
+            return
+
+        conn = self._checkout()
+        self._local.held, self._local.depth = conn, 1
+        try:
+            yield conn
+        finally:
+            broken = getattr(self._local, "broken", False)
+            self._local.held, self._local.broken = None, False
+            self._release(conn, broken=broken)
+
+    def nested(self):
+        """ آیا lease جاری داخل یک lease بیرونی در همین thread است """
+        return getattr(self._local, "depth", 0) > 1
+
+    def mark_broken(self):
+        """ علامت‌گذاری اتصال lease جاری به عنوان خراب تا به pool برنگردد """
+        self._local.broken = True
+
+    def close(self):
+        """ بستن همه‌ی اتصال‌های بیکار """
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._close_quietly(conn)
+
+    def _create(self):
+        conn = self._connect()
+        with self._cond:
+            self._size += 1
+        return conn
+
+    def _checkout(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._cond:
+                if self._closed:
+                    raise RuntimeError("Connection pool is closed")
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                elif self._size < self.max_size:
+                    self._size += 1
+                    conn, last_used = None, None
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError("Timed out waiting for a database connection")
+                    self._cond.wait(remaining)
+                    continue
+
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                return conn
+
+            if self._healthy(conn, last_used):
+                return conn
+            logging.warning("⚠️ Discarding broken database connection, reconnecting...")
+            self._discard(conn)
+
+    def _healthy(self, conn, last_used):
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(self.health_query)
+                cursor.fetchall()
+            finally:
+                cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def _release(self, conn, broken=False):
+        if broken:
+            self._discard(conn)
+            # اتصال‌های بیکار هم احتمالاً قطع شده‌اند؛ در تحویل بعدی حتماً بررسی شوند
+            with self._cond:
+                self._idle = [(idle, float("-inf")) for idle, _ in self._idle]
+            return
+        with self._cond:
+            if self._closed:
+                self._size -= 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+                return
+        self._close_quietly(conn)
+
+    def _discard(self, conn):
+        self._close_quietly(conn)
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
@@ -1,22 +1,298 @@
 import requests
 import json
 import re
+import threading
+import time
+from requests.adapters import HTTPAdapter
+from services.rate_limiter import Backoff, CircuitBreaker, TokenBucket
+
+# پیام‌های Gradio کلید msg و event_id را در ابتدای JSON دارند؛ نوع پیام از همین بایت‌ها خوانده می‌شود
+_SSE_PREFIX = b"data: "
+_HEAD_BYTES = 256
+_GENERATING = b'"process_generating"'
+_COMPLETED = b'"process_completed"'
+_CLOSE_STREAM = b'"close_stream"'
+_EVENT_ID_RE = re.compile(rb'"event_id"\s*:\s*"([^"]+)"')
+_TEXT_KEY = b'"text":'
+_TITLE_KEY = b"optimized_title"
+_JSON_DECODER = json.JSONDecoder()
+
+
+class _SSEParser:
+    """ پارس افزایشی خطوط stream /queue/data
+
+    پیام پایانی process_completed کامل decode می‌شود. process_generating (که هر بار کل گفتگو
+    را دوباره می‌فرستد) فقط وقتی decode می‌شود که on_partial برای آن event خواسته شده باشد یا
+    بررسی بایت‌های خام نشان دهد یک شیء JSON با optimized_title بسته شده است؛ در این حالت
+    (early=True) همان شیء جواب event است و پیام‌های بعدی آن event دور ریخته می‌شوند.
+    """
+    CLOSE = object()
+
+    def __init__(self, service, partial_for=None, early=True):
+        self.service = service
+        self.partial_for = partial_for or (lambda event_id: None)
+        self.early = early
+        self._resolved = set()
+
+    def feed(self, line):
+        """ پردازش یک خط؛ خروجی (event_id, text) وقتی جواب یک event آماده شده، CLOSE یا None
+
+        پیام خراب فقط نادیده گرفته می‌شود تا stream مشترک برای بقیه‌ی eventها باز بماند.
+        """
+        try:
+            return self._feed(line)
+        except Exception as e:
+            print(f"⚠️ Skipping malformed event stream message: {e}")
+            return None
+
+    def _feed(self, line):
+        if not line.startswith(_SSE_PREFIX):
+            return None
+        head = line[len(_SSE_PREFIX):_HEAD_BYTES]
+        match = _EVENT_ID_RE.search(head)
+        event_id = match.group(1).decode() if match else None
+
+        if _GENERATING in head:
+            if event_id in self._resolved:
+                return None
+            on_partial = self.partial_for(event_id)
+            if on_partial is None and not (self.early and _title_object_closed(line)):
+                return None
+            data = self._decode(line)
+            text = None if data is None else self.service._extract_output_text(data)
+            if text is None:
+                return None
+            if on_partial is not None:
+                try:
+                    on_partial(text)
+                except Exception as e:
+                    # خطای callback نباید stream مشترک بقیه‌ی eventها را قطع کند
+                    print(f"⚠️ on_partial callback failed: {e}")
+            title = _title_json(text) if self.early else None
+            if title is None:
+                return None
+            self._resolved.add(event_id)
+            return event_id, title
+
+        if _COMPLETED in head:
+            if event_id in self._resolved:
+                # جواب این event قبلاً از روی پیام‌های در حال تولید برگردانده شده
+                self._resolved.discard(event_id)
+                return None
+            data = self._decode(line)
+            if data is None:
+                return None
+            text = self.service._extract_output_text(data)
+            return data.get("event_id"), text
+
+        if _CLOSE_STREAM in head:
+            return self.CLOSE
+        return None
+
+    @staticmethod
+    def _decode(line):
+        try:
+            data = json.loads(line[len(_SSE_PREFIX):])
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return None
+        return data if isinstance(data, dict) else None
+
+
+def _title_object_closed(line):
+    """ بررسی ارزان روی بایت‌های خام: آیا متن پاسخ مدل شامل optimized_title و یک } پس از آن است
+
+    متن مدل آخرین مقدار "text" در payload است و کوتیشن‌های داخل آن escape شده‌اند،
+    پس اولین کوتیشن escape‌نشده پس از کلید، پایان متن است.
+    """
+    text_start = line.rfind(_TEXT_KEY)
+    if text_start == -1:
+        return False
+    key = line.find(_TITLE_KEY, text_start)
+    if key == -1:
+        return False
+    position = key
+    while True:
+        quote = line.find(b'"', position)
+        if quote == -1:
+            return False
+        backslashes = 0
+        while line[quote - backslashes - 1] == 0x5C:
+            backslashes += 1
+        if backslashes % 2 == 0:
+            return line.find(b"}", key, quote) != -1
+        position = quote + 1
+
+
+def _title_json(text):
+    """ اگر متن شامل یک شیء JSON کامل با عنوان پیشنهادی باشد، متن تا پایان همان شیء """
+    start = text.find("{")
+    if start == -1:
+        return None
+    try:
+        data, end = _JSON_DECODER.raw_decode(text, start)
+    except ValueError:
+        return None
+    if isinstance(data, dict) and ("optimized_title" in data or "optimized_titles" in data):
+        return text[:end]
+    return None
+
+
+class _QueueStream:
+    """ یک خواننده‌ی SSE مشترک روی /queue/data برای کل session
+
+    جواب هر event (پیام process_completed یا شیء JSON کامل وسط تولید) بر اساس event_id
+    به فراخواننده‌ی مربوطه تحویل داده می‌شود، پس چند درخواست هم‌زمان فقط یک stream باز نگه می‌دارند.
+    """
+    _FAILED = object()
+    # جواب eventی که کسی منتظرش نیست (waiter با timeout رفته، یا process_completed دیررس بعد از
+    # جواب زودهنگام روی stream تازه) پس از این مدت دور ریخته می‌شود؛ این فاصله فقط برای جوابی
+    # است که بین join و صدا زدن wait برسد
+    UNCLAIMED_TTL = 60.0
+
+    def __init__(self, service):
+        self.service = service
+        self._cond = threading.Condition()
+        self._waiting = set()
+        self._partials = {}
+        self._completed = {}
+        self._thread = None
+        self._response = None
+        self._closing = False
+
+    def wait(self, event_id, timeout, on_partial=None):
+        """ منتظر ماندن برای متن جواب یک event؛ در صورت شکست یا timeout مقدار None
+
+        on_partial در thread خواننده با متن ناقص هر پیام process_generating صدا زده می‌شود.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._waiting.add(event_id)
+            if on_partial is not None:
+                self._partials[event_id] = on_partial
+            try:
+                while event_id not in self._completed:
+                    self._ensure_running()
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return None
+                    self._cond.wait(remaining)
+                text, _arrived_at = self._completed.pop(event_id)
+                return None if text is self._FAILED else text
+            finally:
+                self._waiting.discard(event_id)
+                self._partials.pop(event_id, None)
+
+    def close(self):
+        """ بستن stream باز تا thread خواننده تمام شود """
+        self._closing = True
+        response = self._response
+        if response is not None:
+            response.close()
+
+    def _ensure_running(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="qwen-sse", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        parser = _SSEParser(self.service, partial_for=self._partials.get)
+        try:
+            response = self.service.session.get(
+                self.service.queue_data_url(), headers=self.service.stream_headers(), stream=True, timeout=60
+            )
+            response.raise_for_status()
+            self.service.breaker.record_success()
+            self._response = response
+            with response:
+                for line in response.iter_lines():
+                    result = parser.feed(line)
+                    if result is None:
+                        continue
+                    if result is _SSEParser.CLOSE:
+                        break
+                    event_id, text = result
+                    with self._cond:
+                        self._deliver(event_id, text if text is not None else self.service.NO_ANSWER_TEXT)
+                        self._cond.notify_all()
+        except Exception as e:
+            # بسته شدن stream در close() هم به همین‌جا می‌رسد و خطا حساب نمی‌شود
+            if not self._closing:
+                print(f"⚠️ Network error while reading event stream: {e}")
+                self.service.breaker.record_failure()
+            with self._cond:
+                for event_id in self._waiting:
+                    self._completed.setdefault(event_id, (self._FAILED, time.monotonic()))
+        finally:
+            with self._cond:
+                # اگر هنوز منتظری هست، فراخوانی بعدی wait یک stream تازه باز می‌کند
+                self._thread = None
+                self._response = None
+                self._cond.notify_all()
+
+    def _deliver(self, event_id, text):
+        """ ثبت جواب یک event و حذف جواب‌های قدیمی بی‌صاحب؛ فقط با نگه‌داشتن _cond """
+        now = time.monotonic()
+        self._completed[event_id] = (text, now)
+        stale = [
+            other for other, (_text, arrived_at) in self._completed.items()
+            if other not in self._waiting and now - arrived_at > self.UNCLAIMED_TTL
+        ]
+        for other in stale:
+            del self._completed[other]
+
 
 class QService:
     BASE_URL = "https://qwen-qwen2-5-1m-demo.hf.space"
     #BASE_URL = "https://qwen-qwq-32b-preview.hf.space"
-    def __init__(self, session_hash):
+    USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/133.0.0.0 Safari/537.36"
+
+    RETRY_STATUSES = {429, 502, 503, 504}
+    NO_ANSWER_TEXT = "متاسفانه الان نمیتونم جواب بدم"
+    RESPONSE_ERROR_TEXT = "خطا در دریافت پاسخ از مدل"
+
+    def __init__(self, session_hash, pool_maxsize=16, response_timeout=120,
+                 rate_limiter=None, breaker=None, backoff=None, max_attempts=4, base_url=None):
         self.session_hash = session_hash
+        if base_url:
+            self.BASE_URL = base_url
+        self.response_timeout = response_timeout
+        self.rate_limiter = rate_limiter or TokenBucket()
+        self.breaker = breaker or CircuitBreaker()
+        self.backoff = backoff or Backoff()
+        self.max_attempts = max_attempts
+        # اتصال‌های keep-alive مشترک برای تمام درخواست‌ها
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._stream = _QueueStream(self)
 
-    def predict(self, text):
-        url = f"{self.BASE_URL}/run/predict?__theme=system"
-        headers = {
+    def close(self):
+        """ بستن اتصال‌های باز """
+        self._stream.close()
+        self.session.close()
+
+    def _headers(self):
+        return {
             "Content-Type": "application/json",
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/133.0.0.0 Safari/537.36",
+            "User-Agent": self.USER_AGENT,
             "Accept": "*/*",
             "Origin": self.BASE_URL,
             "Referer": f"{self.BASE_URL}/?__theme=system"
         }
+
+    def stream_headers(self):
+        return {
+            "Accept": "text/event-stream",
+            "User-Agent": self.USER_AGENT,
+            "Referer": f"{self.BASE_URL}/?__theme=system"
+        }
+
+    def queue_data_url(self):
+        return f"{self.BASE_URL}/queue/data?session_hash={self.session_hash}"
+
+    def predict(self, text):
+        url = f"{self.BASE_URL}/run/predict?__theme=system"
         data = {
             "data": [{"files": [], "text": text}, [[{"id": None, "elem_id": None, "elem_classes": None, "name": None, "text": text, "flushing": None, "avatar": "", "files": []}, [{"id": None, "elem_id": None, "elem_classes": None, "name": None, "text": "", "flushing": None, "avatar": "", "files": []}, None, None]]], None],
             "event_data": None,
@@ -24,17 +300,8 @@ class QService:
             "trigger_id": 5,
             "session_hash": self.session_hash
         }
-        
-        try:
-            response = requests.post(url, headers=headers, json=data, timeout=60)
-            response.raise_for_status()  # This will raise an HTTPError for bad responses (4xx or 5xx)
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            print(f"⚠️ Network error in prediction request: {e}")
-            if response:
-                print(f"⚠️ Response status code: {response.status_code}")
-                print(f"⚠️ Response text: {response.text}")
-            return {"error": "خطا در ارسال درخواست به مدل"}
+
+        return self._post(url, data, "prediction request")
 
     def send_request(self, text):
         predict_response = self.predict(text)
@@ -42,14 +309,6 @@ class QService:
             return predict_response
 
         url = f"{self.BASE_URL}/queue/join?__theme=system"
-        headers = {
-            "Content-Type": "application/json",
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/133.0.0.0 Safari/537.36",
-            "Accept": "*/*",
-            "Origin": self.BASE_URL,
-            "Referer": f"{self.BASE_URL}/?__theme=system"
-        }
-        
         data = {
             "data": [[[{"id": None, "elem_id": None, "elem_classes": None, "name": None, "text": text, "flushing": None, "avatar": "", "files": []}, None]], None, 0],
             "event_data": None,
@@ -57,61 +316,86 @@ class QService:
             "trigger_id": 5,
             "session_hash": self.session_hash
         }
-        
-        try:
-            response = requests.post(url, headers=headers, json=data, timeout=60)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            print(f"⚠️ Network error in sending request: {e}")
-            if response:
-                print(f"⚠️ Response status code: {response.status_code}")
-                print(f"⚠️ Response text: {response.text}")
-            return {"error": "خطا در ارسال درخواست به مدل"}
-
-    def get_response(self):
-        url = f"{self.BASE_URL}/queue/data?session_hash={self.session_hash}"
-        headers = {
-            "Accept": "text/event-stream",
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/133.0.0.0 Safari/537.36",
-            "Referer": f"{self.BASE_URL}/?__theme=system"
-        }
-    
+
+        return self._post(url, data, "sending request")
+
+    def _post(self, url, data, action):
+        """ POST با rate limit، backoff تصادفی، رعایت Retry-After و circuit breaker """
+        for attempt in range(1, self.max_attempts + 1):
+            if not self.breaker.allow():
+                print(f"⚠️ Circuit open, skipping {action}")
+                return {"error": "خطا در ارسال درخواست به مدل"}
+            self.rate_limiter.acquire()
+
+            response = None
+            retry_after = None
+            try:
+                response = self.session.post(url, headers=self._headers(), json=data, timeout=60)
+                if response.status_code in self.RETRY_STATUSES:
+                    retry_after = Backoff.parse_retry_after(response.headers.get("Retry-After"))
+                    self.rate_limiter.throttle()
+                response.raise_for_status()  # This will raise an HTTPError for bad responses (4xx or 5xx)
+                result = response.json()
+                self.breaker.record_success()
+                self.rate_limiter.reward()
+                return result
+            except requests.exceptions.RequestException as e:
+                self.breaker.record_failure()
+                print(f"⚠️ Network error in {action}: {e}")
+                if response is not None:
+                    print(f"⚠️ Response status code: {response.status_code}")
+                    print(f"⚠️ Response text: {response.text}")
+                    if response.status_code < 500 and response.status_code != 429:
+                        break
+                if attempt < self.max_attempts:
+                    time.sleep(self.backoff.delay(attempt, retry_after))
+        return {"error": "خطا در ارسال درخواست به مدل"}
+
+    def get_response(self, event_id=None, on_partial=None):
+        """ دریافت پاسخ مدل؛ با event_id از stream مشترک session خوانده می‌شود
+
+        به محض رسیدن یک شیء JSON کامل با optimized_title جواب برمی‌گردد و منتظر پایان تولید نمی‌ماند.
+        on_partial (اختیاری) با متن ناقص پاسخ در حین تولید صدا زده می‌شود.
+        """
+        if event_id is not None:
+            text = self._stream.wait(event_id, self.response_timeout, on_partial=on_partial)
+            return text if text is not None else self.RESPONSE_ERROR_TEXT
+
         try:
-            response = requests.get(url, headers=headers, stream=True, timeout=60)
+            response = self.session.get(self.queue_data_url(), headers=self.stream_headers(), stream=True, timeout=60)
             response.raise_for_status()
-            for line in response.iter_lines():
-                if line and line.startswith(b"data: "):
-                    try:
-                        data = json.loads(line[6:])
-                        if data.get("msg") == "process_completed":
-                            output_data = data.get("output", {}).get("data", [])
-                            if output_data and isinstance(output_data[0], list) and len(output_data[0]) > 0:
-                                last_text = output_data[0][0][1][0]["text"]
-                                cleaned_text = re.sub(r'<summary>.*?</summary>', '', last_text)
-                                return cleaned_text
-                    except json.JSONDecodeError:
-                        continue
-            return "متاسفانه الان نمیتونم جواب بدم"
+            parser = _SSEParser(self, partial_for=lambda _event_id: on_partial)
+            # خروج از with اتصال را می‌بندد و بقیه‌ی stream خوانده نمی‌شود
+            with response:
+                for line in response.iter_lines():
+                    result = parser.feed(line)
+                    if result is _SSEParser.CLOSE:
+                        break
+                    if result is not None and result[1] is not None:
+                        return result[1]
+            return self.NO_ANSWER_TEXT
         except requests.exceptions.RequestException as e:
             print(f"⚠️ Network error while getting response: {e}")
-            return "خطا در دریافت پاسخ از مدل"
+            return self.RESPONSE_ERROR_TEXT
+
+    def _extract_output_text(self, data):
+        """ استخراج متن آخرین پیام از خروجی process_completed؛ برای ساختار ناشناخته None """
+        try:
+            output_data = data.get("output", {}).get("data", [])
+            if output_data and isinstance(output_data[0], list) and len(output_data[0]) > 0:
+                last_text = output_data[0][0][1][0]["text"]
+                return re.sub(r'<summary>.*?</summary>', '', last_text)
+        except (AttributeError, IndexError, KeyError, TypeError):
+            # یک پیام با شکل غیرمنتظره فقط همان event را بی‌جواب می‌گذارد، نه کل stream را
+            print(f"⚠️ Unexpected output format in event {data.get('event_id') if isinstance(data, dict) else None}")
+        return None
 
     def extract_last_text(self, response_text):
-        messages = response_text.strip().split("\n")
+        """ متن آخرین پیام process_completed از یک پاسخ SSE کامل """
+        parser = _SSEParser(self, early=False)
         last_text = None
-        
-        for message in messages:
-            if message.startswith("data: "):
-                try:
-                    data = json.loads(message[6:])
-                    if data.get("msg") == "process_completed":
-                        output_data = data.get("output", {}).get("data", [])
-                        if output_data and isinstance(output_data[0], list) and len(output_data[0]) > 0:
-                            last_text = output_data[0][0][1][0]["text"]
-                except json.JSONDecodeError:
-                    continue
-        if last_text is None:
-            return "متاسفانه الان نمیتونم جواب بدم"
-        cleaned_text = re.sub(r'<summary>.*?</summary>', '', last_text)
-        return cleaned_text
+        for message in response_text.strip().split("\n"):
+            result = parser.feed(message.encode("utf-8"))
+            if result is not None and result is not _SSEParser.CLOSE and result[1] is not None:
+                last_text = result[1]
+        return last_text if last_text is not None else self.NO_ANSWER_TEXT
@@ -0,0 +1,169 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+SCORE_BUCKETS = (0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10)
+ATTEMPT_BUCKETS = (1, 2, 3, 4, 5, 6, 8, 10)
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """ تخمین quantile از روی bucketها (حد بالای bucket) """
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float("inf")
+
+
+class MetricsRegistry:
+    """ شمارنده‌ها و هیستوگرام‌های سبک برای مراحل pipeline با خروجی متنی Prometheus
+
+    هر metric با نام و برچسب‌هایش شناخته می‌شود؛ ثبت هر مقدار فقط یک lookup و یک lock کوتاه است.
+    """
+    def __init__(self):
+        self._counters = {}
+        self._histograms = {}
+        self._help = {}
+        self._lock = threading.Lock()
+
+    def describe(self, name, help_text):
+        self._help[name] = help_text
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(buckets)
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """ اندازه‌گیری زمان یک بلوک و ثبت آن در هیستوگرام name """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self):
+        """ خروجی متنی به فرمت exposition پرومتئوس """
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+            described = set()
+
+            def header(name, kind):
+                if name not in described:
+                    described.add(name)
+                    if name in self._help:
+                        lines.append(f"# HELP {name} {self._help[name]}")
+                    lines.append(f"# TYPE {name} {kind}")
+
+            for (name, labels), value in counters:
+                header(name, "counter")
+                lines.append(f"{name}{_labels(labels)} {value}")
+            for (name, labels), histogram in histograms:
+                header(name, "histogram")
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', _number(bound)),))} {cumulative}")
+                lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {histogram.count}")
+                lines.append(f"{name}_sum{_labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """ نوشتن اتمیک خروجی در فایل (برای textfile collector) """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp, path)
+
+    def serve(self, port, host="0.0.0.0"):
+        """ راه‌اندازی endpoint /metrics در یک thread پس‌زمینه """
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        return server
+
+    def summary(self):
+        """ خلاصه‌ی خوانا برای پایان اجرا """
+        lines = []
+        with self._lock:
+            for (name, labels), histogram in sorted(self._histograms.items(), key=lambda item: item[0]):
+                lines.append(
+                    f"{name}{_labels(labels)}: n={histogram.count} total={histogram.sum:.2f}"
+                    f" mean={histogram.sum / histogram.count if histogram.count else 0:.3f}"
+                    f" p50≤{_number(histogram.quantile(0.5))} p95≤{_number(histogram.quantile(0.95))}"
+                )
+            for (name, labels), value in sorted(self._counters.items()):
+                lines.append(f"{name}{_labels(labels)}: {value}")
+        return "\n".join(lines)
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+def _number(value):
+    return str(int(value)) if float(value).is_integer() else str(value)
+
+
+REGISTRY = MetricsRegistry()
+REGISTRY.describe("seo_stage_seconds", "Time spent per pipeline stage")
+REGISTRY.describe("seo_llm_requests_total", "LLM prompts by outcome")
+REGISTRY.describe("seo_parse_failures_total", "LLM responses that could not be parsed")
+REGISTRY.describe("seo_rows_total", "Content rows finished")
+REGISTRY.describe("seo_attempts_per_row", "LLM attempts needed per row")
+REGISTRY.describe("seo_final_score", "Final SEO score per row")
+REGISTRY.describe("seo_triage_skipped_total", "Original titles that already passed min_score")
+REGISTRY.describe("seo_dedup_members_total", "Duplicate titles that reused their group's optimized title")
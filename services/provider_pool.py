@@ -0,0 +1,116 @@
+import logging
+import threading
+import time
+
+class _Backend:
+    def __init__(self, service):
+        self.service = service
+        self.outstanding = 0
+        self.latency = None  # میانگین نمایی زمان پاسخ (ثانیه)
+        self.failures = 0
+        self.ejected_until = 0.0
+
+
+class QServicePool:
+    """ توزیع درخواست‌ها بین چند endpoint / session_hash با همان رابط QService
+
+    انتخاب backend بر اساس کمترین درخواست در جریان و سپس کمترین latency است؛
+    backendهایی که پشت سر هم خطا می‌دهند برای مدتی کنار گذاشته می‌شوند.
+    send_request یک event_id ترکیبی برمی‌گرداند تا get_response به همان backend برگردد.
+    """
+    def __init__(self, services, max_failures=3, eject_seconds=60, latency_alpha=0.3):
+        if not services:
+            raise ValueError("QServicePool needs at least one backend")
+        self.backends = [_Backend(service) for service in services]
+        self.max_failures = max_failures
+        self.eject_seconds = eject_seconds
+        self.latency_alpha = latency_alpha
+        self._lock = threading.Lock()
+        self._started = {}
+
+    def __len__(self):
+        return len(self.backends)
+
+    @property
+    def BASE_URL(self):
+        return "|".join(sorted({backend.service.BASE_URL for backend in self.backends}))
+
+    def send_request(self, text):
+        index = self._acquire()
+        backend = self.backends[index]
+        started = time.monotonic()
+        joined = backend.service.send_request(text)
+        if "error" in joined:
+            self._release(index, ok=False)
+            return joined
+        event_id = (index, joined.get("event_id"))
+        with self._lock:
+            self._started[event_id] = started
+        return {**joined, "event_id": event_id}
+
+    def get_response(self, event_id=None, on_partial=None):
+        if not isinstance(event_id, tuple):
+            raise ValueError("QServicePool.get_response needs the event_id returned by send_request")
+        index, backend_event_id = event_id
+        service = self.backends[index].service
+        try:
+            text = service.get_response(backend_event_id, on_partial=on_partial)
+        except Exception:
+            self._release(index, ok=False, event_id=event_id)
+            raise
+        ok = text not in (service.NO_ANSWER_TEXT, service.RESPONSE_ERROR_TEXT)
+        self._release(index, ok=ok, event_id=event_id)
+        return text
+
+    def close(self):
+        for backend in self.backends:
+            backend.service.close()
+
+    def stats(self):
+        with self._lock:
+            return [
+                {
+                    "base_url": b.service.BASE_URL,
+                    "session_hash": b.service.session_hash,
+                    "outstanding": b.outstanding,
+                    "latency": round(b.latency, 3) if b.latency is not None else None,
+                    "ejected": b.ejected_until > time.monotonic()
+                }
+                for b in self.backends
+            ]
+
+    def _acquire(self):
+        now = time.monotonic()
+        with self._lock:
+            healthy = [i for i, b in enumerate(self.backends) if b.ejected_until <= now]
+            # اگر همه کنار گذاشته شده‌اند، به جای توقف کامل همه را دوباره امتحان کن
+            candidates = healthy or range(len(self.backends))
+            index = min(
+                candidates,
+                key=lambda i: (self.backends[i].outstanding, self.backends[i].latency or 0.0)
+            )
+            self.backends[index].outstanding += 1
+            return index
+
+    def _release(self, index, ok, event_id=None):
+        backend = self.backends[index]
+        with self._lock:
+            backend.outstanding -= 1
+            started = self._started.pop(event_id, None)
+            if not ok:
+                backend.failures += 1
+                if backend.failures >= self.max_failures:
+                    backend.ejected_until = time.monotonic() + self.eject_seconds
+                    backend.failures = 0
+                    logging.warning(
+                        f"⚠️ Ejecting LLM backend {backend.service.BASE_URL} ({backend.service.session_hash}) "
+                        f"for {self.eject_seconds}s"
+                    )
+                return
+            backend.failures = 0
+            if started is not None:
+                elapsed = time.monotonic() - started
+                if backend.latency is None:
+                    backend.latency = elapsed
+                else:
+                    backend.latency += self.latency_alpha * (elapsed - backend.latency)
@@ -0,0 +1,49 @@
+def purecontent_filters(modified_column, lang_id=None, category_id=None, id_range=None, only_null_title=False,
+                        modified_since=None, alias=""):
+    """ساخت شرط‌های WHERE پارامتری برای انتخاب بخشی از محتواهای TblPureContent
+
+    id_range یک (start, end) شامل دو سر است و هر سر می‌تواند None باشد.
+    modified_column ستون زمان آخرین تغییر برای modified_since است.
+    خروجی (لیست شرط‌ها، لیست پارامترها) است تا به کوئری‌های دیگر هم اضافه شود.
+    """
+    clauses, params = [], []
+    if lang_id is not None:
+        clauses.append(f"{alias}ContentLanguageId = ?")
+        params.append(lang_id)
+    if category_id is not None:
+        clauses.append(f"{alias}ContentCategoryId = ?")
+        params.append(category_id)
+    if id_range is not None:
+        start, end = id_range
+        if start is not None:
+            clauses.append(f"{alias}Id >= ?")
+            params.append(start)
+        if end is not None:
+            clauses.append(f"{alias}Id <= ?")
+            params.append(end)
+    if only_null_title:
+        clauses.append(f"({alias}Title IS NULL OR {alias}Title = '')")
+    if modified_since is not None:
+        clauses.append(f"{alias}{modified_column} >= ?")
+        params.append(modified_since)
+    return clauses, params
+
+
+def iter_keyset_pages(fetch_page, page_size=500, start_after=0, limit=None):
+    """پیمایش keyset روی Id؛ fetch_page(size, last_id) حداکثر size ردیف با Id > last_id برمی‌گرداند
+
+    Id باید ستون اول ردیف‌ها باشد. limit حداکثر تعداد کل ردیف‌های برگشتی است.
+    """
+    last_id = start_after
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = page_size if remaining is None else min(page_size, remaining)
+        rows = fetch_page(size, last_id)
+        if not rows:
+            return
+        yield from rows
+        if len(rows) < size:
+            return
+        last_id = rows[-1][0]
+        if remaining is not None:
+            remaining -= len(rows)
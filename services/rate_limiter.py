@@ -0,0 +1,116 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+class TokenBucket:
+    """ محدودکننده‌ی نرخ token bucket با تنظیم تطبیقی (AIMD)
+
+    در پاسخ‌های موفق نرخ کم‌کم تا max_rate بالا می‌رود و با 429/503 نصف می‌شود،
+    پس throughput به ظرفیت واقعی endpoint نزدیک می‌شود.
+    """
+    def __init__(self, rate=1.0, capacity=2, min_rate=0.05, max_rate=10.0, increase=0.05):
+        self.rate = rate
+        self.capacity = capacity
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """ منتظر ماندن تا یک token آزاد شود """
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def reward(self):
+        """ افزایش جمعی نرخ پس از پاسخ موفق """
+        with self._lock:
+            self.rate = min(self.rate + self.increase, self.max_rate)
+
+    def throttle(self):
+        """ کاهش ضربی نرخ پس از overload شدن endpoint """
+        with self._lock:
+            self._refill()
+            self.rate = max(self.rate / 2, self.min_rate)
+            self._tokens = min(self._tokens, 0.0)
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+class Backoff:
+    """ محاسبه‌ی تأخیر exponential با full jitter و رعایت Retry-After """
+    def __init__(self, base=1.0, maximum=60.0):
+        self.base = base
+        self.maximum = maximum
+
+    def delay(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return min(retry_after, self.maximum)
+        return random.uniform(0, min(self.maximum, self.base * 2 ** (attempt - 1)))
+
+    @staticmethod
+    def parse_retry_after(value):
+        """ تبدیل هدر Retry-After (ثانیه یا تاریخ HTTP) به ثانیه """
+        if not value:
+            return None
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            pass
+        try:
+            return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+        except (TypeError, ValueError):
+            return None
+
+
+class CircuitBreaker:
+    """ circuit breaker سه‌حالته (closed / open / half_open) """
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """ آیا درخواست جدید مجاز است؛ در half_open فقط یک درخواست آزمایشی """
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == self.HALF_OPEN:
+                if self._probe_in_flight:
+                    return False
+                self._probe_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
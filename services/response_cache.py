@@ -0,0 +1,125 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from services.sqlite_store import connect_sqlite
+
+class ResponseCache:
+    """ کش پاسخ‌های LLM با دو لایه: LRU در حافظه و SQLite روی دیسک
+
+    کلید بر اساس hash محتوای prompt و namespace (آدرس مدل) ساخته می‌شود.
+    """
+    def __init__(self, path="seo_output/llm_cache.db", max_memory_entries=1024,
+                 max_disk_entries=100000, ttl=7 * 24 * 3600, evict_every=1000):
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl = ttl
+        # پاک‌سازی دیسک هر evict_every درج؛ اجرای طولانی یا crash‌کرده هم کش را محدود نگه می‌دارد
+        self.evict_every = evict_every
+        self._inserts = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        if path:
+            self._conn = connect_sqlite(path)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " key TEXT PRIMARY KEY, response TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_created ON llm_cache (created_at)")
+            self._conn.commit()
+
+    @staticmethod
+    def make_key(namespace, prompt, attempt=1):
+        """ ساخت کلید کش؛ شماره‌ی تلاش جزو کلید است تا retryها پاسخ‌های متفاوت نگه دارند """
+        raw = f"{namespace}\n{attempt}\n{prompt}".encode("utf-8")
+        return hashlib.sha256(raw).hexdigest()
+
+    def get(self, key):
+        """ خواندن پاسخ از کش؛ در صورت نبودن یا انقضا None """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                response, created_at = entry
+                if not self._expired(created_at, now):
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return response
+                del self._memory[key]
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row and not self._expired(row[1], now):
+                    self._remember(key, row[0], row[1])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def set(self, key, response):
+        """ ذخیره‌ی پاسخ در هر دو لایه """
+        now = time.time()
+        with self._lock:
+            self._remember(key, response, now)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, response, created_at) VALUES (?, ?, ?)",
+                    (key, response, now)
+                )
+                self._inserts += 1
+                if self.evict_every and self._inserts % self.evict_every == 0:
+                    self._evict()
+                self._conn.commit()
+
+    def evict(self):
+        """ حذف رکوردهای منقضی و قدیمی‌ترین رکوردهای اضافه روی دیسک """
+        if self._conn is None:
+            return
+        with self._lock:
+            self._evict()
+            self._conn.commit()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "memory_entries": len(self._memory)
+        }
+
+    def close(self):
+        if self._conn is not None:
+            self.evict()
+            self._conn.close()
+            self._conn = None
+        logging.info(f"🗃️ LLM cache stats: {self.stats()}")
+
+    def _evict(self):
+        if self.ttl:
+            self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.ttl,))
+        self._conn.execute(
+            "DELETE FROM llm_cache WHERE key IN ("
+            " SELECT key FROM llm_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_entries,)
+        )
+
+    def _expired(self, created_at, now):
+        return bool(self.ttl) and now - created_at > self.ttl
+
+    def _remember(self, key, response, created_at):
+        self._memory[key] = (response, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
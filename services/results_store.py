@@ -0,0 +1,137 @@
+import json
+import os
+import threading
+import time
+from services.sqlite_store import connect_sqlite
+
+class JSONLResultsWriter:
+    """ نوشتن افزایشی نتایج به صورت JSONL فشرده با fsync دوره‌ای
+
+    هر رکورد همان لحظه به فایل اضافه می‌شود، پس crash فقط چند رکورد آخر را از دست می‌دهد.
+    """
+    def __init__(self, path, fsync_every=50):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.count = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+        self._file.flush()
+        self.count += 1
+        if self.count % self.fsync_every == 0:
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        if not self._file.closed:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+
+
+class RunHistoryStore:
+    """ تاریخچه‌ی نتایج همه‌ی اجراها در SQLite با ایندکس روی run_id و content_id """
+    def __init__(self, path="seo_output/run_history.db", commit_every=100):
+        self.path = path
+        self.commit_every = commit_every
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._conn = connect_sqlite(path)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id TEXT PRIMARY KEY,
+                started_at REAL NOT NULL,
+                finished_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS results (
+                run_id TEXT NOT NULL,
+                content_id INTEGER NOT NULL,
+                original_title TEXT,
+                optimized_title TEXT,
+                seo_score REAL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (run_id, content_id)
+            );
+            CREATE INDEX IF NOT EXISTS ix_results_content ON results (content_id, created_at);
+            """
+        )
+        self._conn.commit()
+
+    def start_run(self, run_id):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO runs (run_id, started_at) VALUES (?, ?)", (run_id, time.time())
+            )
+            self._conn.commit()
+
+    def add(self, run_id, record, created_at=None):
+        """ ثبت نتیجه‌ی یک محتوا در یک اجرا """
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results"
+                " (run_id, content_id, original_title, optimized_title, seo_score, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (run_id, record["content_id"], record.get("original_title"), record.get("optimized_title"),
+                 record.get("seo_score"), created_at or time.time())
+            )
+            self._pending += 1
+            if self._pending >= self.commit_every:
+                self._conn.commit()
+                self._pending = 0
+
+    def finish_run(self, run_id):
+        with self._lock:
+            self._conn.execute("UPDATE runs SET finished_at = ? WHERE run_id = ?", (time.time(), run_id))
+            self._conn.commit()
+            self._pending = 0
+
+    def latest_scores(self, content_ids=None):
+        """ آخرین امتیاز هر content_id: {content_id: (run_id, optimized_title, seo_score)} """
+        query = (
+            "SELECT r.content_id, r.run_id, r.optimized_title, r.seo_score FROM results r"
+            " WHERE r.created_at = (SELECT MAX(created_at) FROM results WHERE content_id = r.content_id)"
+        )
+        params = []
+        if content_ids is not None:
+            content_ids = list(content_ids)
+            query += f" AND r.content_id IN ({', '.join('?' * len(content_ids))})"
+            params = content_ids
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return {content_id: (run_id, title, score) for content_id, run_id, title, score in rows}
+
+    def regressions(self, old_run_id, new_run_id, min_drop=0.0):
+        """ محتواهایی که امتیازشان بین دو اجرا بیش از min_drop کم شده """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT n.content_id, o.seo_score, n.seo_score, o.optimized_title, n.optimized_title"
+                " FROM results n JOIN results o ON o.content_id = n.content_id AND o.run_id = ?"
+                " WHERE n.run_id = ? AND o.seo_score - n.seo_score > ?"
+                " ORDER BY o.seo_score - n.seo_score DESC",
+                (old_run_id, new_run_id, min_drop)
+            ).fetchall()
+
+    def import_results_file(self, path, run_id=None):
+        """ وارد کردن یک فایل نتایج قدیمی (JSON یا JSONL) به تاریخچه """
+        run_id = run_id or os.path.splitext(os.path.basename(path))[0].replace("seo_results_", "")
+        created_at = os.path.getmtime(path)
+        with open(path, encoding="utf-8") as f:
+            text = f.read().strip()
+        if not text:
+            return 0
+        if path.endswith(".jsonl"):
+            records = [json.loads(line) for line in text.splitlines() if line.strip()]
+        else:
+            records = json.loads(text)
+        self.start_run(run_id)
+        for record in records:
+            self.add(run_id, record, created_at=created_at)
+        self.finish_run(run_id)
+        return len(records)
+
+    def close(self):
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
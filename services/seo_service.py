@@ -1,103 +1,404 @@
 import json
 import time
 import logging
-import os
-import re
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from services.seo_title_evaluator import SEOTitleEvaluator
 from services.llm_service import QService
+from services.rate_limiter import Backoff
+from services.results_store import JSONLResultsWriter
+from services.metrics import ATTEMPT_BUCKETS, REGISTRY, SCORE_BUCKETS
+
+# حداکثر طول Description که برای ساخت عنوان در prompt قرار می‌گیرد
+DESCRIPTION_PROMPT_CHARS = 2000
+
+class _RunState:
+    """ وضعیت یک اجرا: فایل نتایج و Idهای تمام‌شده در آخرین دسته """
+    def __init__(self, run_id, results):
+        self.run_id = run_id
+        self.results = results
+        self.finished = set()
 
 class SEOService:
-    def __init__(self, db, q_service, min_score=7.0, retries=5, delay=5):
+    def __init__(self, db, q_service, min_score=7.0, retries=5, delay=5, concurrency=1,
+                 cache=None, page_size=500, writer=None, checkpoint=None, incremental=False,
+                 candidates=1, history=None, metrics_path="seo_output/metrics.prom",
+                 triage=False, llm_call_budget=None, dedup=None):
         self.db = db
         self.q_service = q_service
         self.min_score = min_score
         self.retries = retries
         self.delay = delay
+        # delay پایه‌ی backoff تصادفی پس از پاسخ‌های ناموفق است
+        self.backoff = Backoff(base=delay)
+        self.concurrency = concurrency
+        self.cache = cache
+        self.page_size = page_size
+        self.writer = writer
+        self.checkpoint = checkpoint
+        self.incremental = incremental
+        self.candidates = candidates
+        self.history = history
+        self.metrics_path = metrics_path
+        self.triage = triage
+        self.llm_call_budget = llm_call_budget
+        self.llm_calls = 0
+        self._budget_lock = threading.Lock()
+        self.dedup = dedup
+        # شناسه‌ی نماینده‌ی هر گروه تکراری -> ردیف‌های دیگر همان گروه
+        self._cluster_members = {}
         self.evaluator = SEOTitleEvaluator()
 
-    def extract_focus_keyword(self, title):
-        """ استخراج هوشمند کلمه کلیدی از عنوان با حذف stopwords و تمرکز بر اسم‌ها """
-        stopwords = {"the", "of", "and", "a", "an", "to", "in", "on", "for", "with", "at", "by"}
-        words = [w.lower() for w in re.findall(r'\w+', title) if w.lower() not in stopwords]
-        
-        # اولویت با کلمات کلیدی معنایی‌تر
-        if len(words) >= 2:
-            return f"{words[0]} {words[1]}"
-        elif words:
-            return words[0]
-        return title.strip().lower()
-
-    def generate_title_for_all(self):
-        """ تولید عنوان بهینه برای تمام محتواها """
-        contents = self.db.get_all_purecontents()
-        results = []
+    def extract_focus_keyword(self, title, lang_id=None):
+        """ استخراج هوشمند کلمه کلیدی از عنوان با حذف stopwords زبان و تمرکز بر اسم‌ها """
+        return self.evaluator.focus_keyword(title, lang_id)
+
+    def generate_title_for_all(self, concurrency=None, contents=None, run_id=None, from_description=False):
+        """ تولید عنوان بهینه برای تمام محتواها
+
+        با concurrency بیشتر از ۱، چند ردیف هم‌زمان در یک thread pool بهینه می‌شوند.
+        به‌روزرسانی دیتابیس و ترتیب نتایج همان مسیر ترتیبی است.
+        contents (ردیف‌های Id, Title, ContentLanguageId) به جای کل جدول پردازش می‌شود.
+        با from_description=True متن منبع Description است، نه عنوان: triage نمی‌شود و اگر
+        مدل عنوانی نسازد، چیزی (به‌خصوص خود متن منبع) در Title نوشته نمی‌شود.
+        """
+        run = self.start_run(run_id)
+        try:
+            if contents is None:
+                # فقط ستون‌های لازم، صفحه‌به‌صفحه؛ پردازش از همان صفحه‌ی اول شروع می‌شود
+                contents = self.db.iter_purecontents(
+                    columns=("Id", "Title", "ContentLanguageId"), page_size=self.page_size
+                )
+            self.process_contents(run, contents, concurrency, from_description)
+        finally:
+            self.finish_run(run)
+
+    def start_run(self, run_id=None):
+        """ شروع یک اجرا: فایل نتایج و ردیف تاریخچه‌ی آن؛ با finish_run بسته می‌شود """
+        run_id = run_id or datetime.now().strftime("%Y%m%d_%H%M%S")
+        run = _RunState(run_id, self._open_results(run_id))
+        if self.history is not None:
+            self.history.start_run(run_id)
+        return run
+
+    def process_contents(self, run, contents, concurrency=None, from_description=False):
+        """ پردازش یک دسته ردیف در اجرای run
+
+        خروجی مجموعه‌ی Idهایی است که کارشان تمام شده: عنوانشان نوشته شده یا نیازی به تغییر
+        نداشته‌اند. ردیف‌های بدون پیشنهاد امتیازدهی‌شده (خطای مدل یا تمام شدن بودجه) در آن نیستند.
+        triage و dedup فقط روی ردیف‌های همین دسته اعمال می‌شوند.
+        """
+        concurrency = concurrency or self.concurrency
+        run.finished = set()
+        rows = self._source_rows(run, contents)
+        if self.checkpoint is not None and self.incremental:
+            rows = self._changed_rows(run, rows)
+        if self.dedup is not None:
+            rows = self._dedup_rows(rows)
 
+        try:
+            if self.triage and not from_description:
+                rows = self._triage_rows(run, rows)
+            else:
+                rows = ((content_id, title, lang_id, 0.0) for content_id, title, lang_id in rows)
+            if self.llm_call_budget is not None:
+                rows = self._within_budget(rows)
+            self._run_rows(run, rows, concurrency, from_description=from_description)
+        finally:
+            # هر چه در بافر نوشتن مانده، حتی در صورت خطا، در دیتابیس ثبت شود
+            if self.writer is not None:
+                self.writer.flush()
+            if self.checkpoint is not None:
+                self.checkpoint.commit()
+        return run.finished
+
+    def finish_run(self, run):
+        """ بستن فایل نتایج، ثبت پایان اجرا در تاریخچه و نوشتن metrics """
+        run.results.close()
+        if self.history is not None:
+            self.history.finish_run(run.run_id)
+        logging.info(f"📁 Saved {run.results.count} results: {run.results.path}")
+        if self.metrics_path:
+            REGISTRY.write(self.metrics_path)
+        logging.info(f"📊 Pipeline metrics:\n{REGISTRY.summary()}")
+
+    def _source_rows(self, run, contents):
+        """ ردیف‌های (Id, Title, ContentLanguageId) با متن غیرخالی """
         for content_id, title, *_rest, lang_id in contents:
-            if not title or not title.strip():
-                continue
+            if title and title.strip():
+                yield content_id, title, lang_id
+            else:
+                # متن خالی کاری برای انجام ندارد
+                run.finished.add(content_id)
 
-            keyword = self.extract_focus_keyword(title)
-            best_title, best_score = title, 0.0
+    def _run_rows(self, run, rows, concurrency, from_description=False):
+        """ اجرای ترتیبی یا موازی بهینه‌سازی روی ردیف‌ها """
+        if concurrency <= 1:
+            optimized = (
+                (content_id, title, self._optimize_title(title, lang_id, original_score, from_description))
+                for content_id, title, lang_id, original_score in rows
+            )
+            for content_id, title, result in optimized:
+                for record in self._finish_cluster(content_id, title, *result):
+                    self._save_result(run, record)
+        else:
+            with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="seo") as pool:
+                # پنجره‌ی محدود از درخواست‌های در جریان؛ ترتیب خروجی حفظ می‌شود
+                pending = deque()
+                for content_id, title, lang_id, original_score in rows:
+                    pending.append((
+                        content_id, title,
+                        pool.submit(self._optimize_title, title, lang_id, original_score, from_description)
+                    ))
+                    if len(pending) >= concurrency * 2:
+                        content_id, title, future = pending.popleft()
+                        for record in self._finish_cluster(content_id, title, *future.result()):
+                            self._save_result(run, record)
+                while pending:
+                    content_id, title, future = pending.popleft()
+                    for record in self._finish_cluster(content_id, title, *future.result()):
+                        self._save_result(run, record)
 
-            for i in range(1, self.retries + 1):
-                prompt = self._build_prompt(title, lang_id, last_score=best_score)
-                response = self._ask_qwen(prompt)
+    def _changed_rows(self, run, rows):
+        """ فقط ردیف‌های جدید یا تغییرکرده از آخرین اجرا """
+        skipped = 0
+        for content_id, title, lang_id in rows:
+            state = self.checkpoint.get(content_id)
+            if state is not None:
+                current = self.checkpoint.title_hash(title)
+                if current == state.result_hash:
+                    run.finished.add(content_id)
+                    skipped += 1
+                    continue
+                if current == state.title_hash:
+                    # نتیجه قبلاً ساخته شده ولی پیش از crash در دیتابیس نوشته نشده
+                    self._update_title_in_database(content_id, state.optimized_title, state.seo_score)
+                    run.finished.add(content_id)
+                    skipped += 1
+                    continue
+            yield content_id, title, lang_id
+        logging.info(f"⏭️ Incremental run: skipped {skipped} unchanged contents")
 
-                if not response:
-                    logging.warning(f"⚠️ Attempt {i}: No response from Qwen. Retrying...")
-                    time.sleep(self.delay)
+    def _dedup_rows(self, rows):
+        """ فقط نماینده‌ی هر گروه عنوان تکراری (یکسان پس از نرمال‌سازی) به LLM می‌رود
+
+        نتیجه‌ی نماینده در _finish_cluster برای بقیه‌ی اعضای گروه هم ثبت می‌شود.
+        """
+        with REGISTRY.timer("seo_stage_seconds", stage="dedup"):
+            clusters = self.dedup.cluster(rows)
+        self._cluster_members = {representative[0]: members for representative, members in clusters if members}
+        duplicates = sum(len(members) for members in self._cluster_members.values())
+        REGISTRY.inc("seo_dedup_members_total", duplicates)
+        logging.info(f"🧬 Dedup: {len(clusters)} unique titles, {duplicates} duplicates reuse their group's result")
+        return [representative for representative, _ in clusters]
+
+    def _triage_rows(self, run, rows):
+        """ امتیازدهی عناوین اصلی پیش از هر فراخوانی LLM
+
+        ردیف‌هایی که همین حالا به min_score می‌رسند رد می‌شوند و بقیه از کم‌امتیازترین مرتب می‌شوند.
+        اگر نماینده‌ی یک گروه تکراری رد شود، عنوان خودش برای اعضایی که فقط در پیشوند،
+        حروف بزرگ/کوچک یا علائم نگارشی با آن فرق دارند ثبت می‌شود.
+        """
+        scored = []
+        passed = 0
+        with REGISTRY.timer("seo_stage_seconds", stage="triage"):
+            for content_id, title, lang_id in rows:
+                score = self.evaluator.evaluate(title, self.extract_focus_keyword(title, lang_id), lang_id)
+                if score >= self.min_score:
+                    passed += 1
+                    run.finished.add(content_id)
+                    # مثلاً «Final Title: ...» کنار نسخه‌ی تمیز خودش نماند
+                    for member_id, member_title, _lang_id in self._cluster_members.pop(content_id, ()):
+                        if member_title != title:
+                            self._save_result(run, self._finish_row(member_id, member_title, title, score))
+                        run.finished.add(member_id)
                     continue
+                scored.append((content_id, title, lang_id, score))
+            scored.sort(key=lambda row: row[3])
+        REGISTRY.inc("seo_triage_skipped_total", passed)
+        logging.info(f"🩺 Triage: {passed} titles already pass, {len(scored)} queued for LLM (lowest score first)")
+        return scored
+
+    def _within_budget(self, rows):
+        """ توقف ورود ردیف‌های تازه وقتی بودجه‌ی فراخوانی LLM تمام شده """
+        for row in rows:
+            if self._budget_exhausted():
+                logging.warning("⚠️ LLM call budget exhausted, remaining contents are left for the next run.")
+                return
+            yield row
+
+    def _budget_exhausted(self):
+        return self.llm_call_budget is not None and self.llm_calls >= self.llm_call_budget
+
+    def _take_llm_call(self):
+        """ رزرو یک فراخوانی از بودجه‌ی LLM این اجرا """
+        with self._budget_lock:
+            if self._budget_exhausted():
+                return False
+            self.llm_calls += 1
+            return True
+
+    def _optimize_title(self, title, lang_id, original_score=0.0, from_description=False):
+        """ حلقه‌ی تلاش مجدد برای یک عنوان
+
+        خروجی (بهترین عنوان، امتیاز، scored)؛ scored یعنی حداقل یک پیشنهاد مدل امتیازدهی شده است.
+        با from_description=True ورودی متن Description است: مدل از روی آن عنوان و کلمه کلیدی
+        می‌سازد و خود متن هرگز به عنوان نتیجه برنمی‌گردد.
+        """
+        if from_description:
+            # کلمه کلیدی را مدل از روی متن انتخاب می‌کند؛ چند کلمه‌ی اول Description فقط جایگزین است
+            keyword = None
+            best_title, best_score = None, original_score
+        else:
+            keyword = self.extract_focus_keyword(title, lang_id)
+            best_title, best_score = title, original_score
+        attempts = 0
+        scored = False
 
-                try:
+        for i in range(1, self.retries + 1):
+            if self._budget_exhausted():
+                break
+            attempts = i
+            if from_description:
+                prompt = self._build_description_prompt(title, lang_id, keyword, last_score=best_score)
+            else:
+                prompt = self._build_prompt(title, lang_id, last_score=best_score)
+            response = self._ask_qwen(prompt, attempt=i)
+
+            if not response:
+                logging.warning(f"⚠️ Attempt {i}: No response from Qwen. Retrying...")
+                self._sleep(self.backoff.delay(i))
+                continue
+
+            try:
+                with REGISTRY.timer("seo_stage_seconds", stage="parse"):
                     data = self._parse_response(response)
-                    candidate = data.get("optimized_title", "").strip()
+                    candidates = self._extract_candidates(data)
 
-                    if not candidate:
-                        logging.warning(f"⚠️ Attempt {i}: Empty optimized title in response. Retrying...")
-                        time.sleep(self.delay)
-                        continue
+                if not candidates:
+                    logging.warning(f"⚠️ Attempt {i}: Empty optimized title in response. Retrying...")
+                    REGISTRY.inc("seo_parse_failures_total", reason="empty")
+                    self._sleep(self.backoff.delay(i))
+                    continue
 
-                    score = self.evaluator.evaluate(candidate, keyword)
-                    logging.info(f"🔁 Attempt {i}: «{candidate}» (SEO Score: {score})")
+                if keyword is None:
+                    # همین کلمه کلیدی در تلاش‌های بعدی ثابت می‌ماند تا امتیازها قابل مقایسه باشند
+                    keyword = self._extract_keyword(data) or self.extract_focus_keyword(title, lang_id)
 
-                    if score > best_score:
-                        best_title = candidate
-                        best_score = score
+                # امتیازدهی یک‌جای همه‌ی پیشنهادها و نگه‌داشتن بهترین
+                with REGISTRY.timer("seo_stage_seconds", stage="evaluate"):
+                    scores = self.evaluator.evaluate_batch(candidates, keyword, lang_id)
+                score, candidate = max(zip(scores, candidates), key=lambda pair: pair[0])
+                scored = True
+                logging.info(f"🔁 Attempt {i}: «{candidate}» (SEO Score: {score}, {len(candidates)} candidates)")
 
-                    if score >= self.min_score:
-                        logging.info(f"✅ Attempt {i}: Score meets threshold. Final title found!")
-                        break
+                if best_title is None or score > best_score:
+                    best_title = candidate
+                    best_score = score
 
-                except Exception as ex:
-                    logging.warning(f"⚠️ Attempt {i}: Invalid response format: {response} | Error: {ex}")
+                if score >= self.min_score:
+                    logging.info(f"✅ Attempt {i}: Score meets threshold. Final title found!")
+                    break
 
-                time.sleep(self.delay)
+            except Exception as ex:
+                logging.warning(f"⚠️ Attempt {i}: Invalid response format: {response} | Error: {ex}")
+                REGISTRY.inc("seo_parse_failures_total", reason="invalid")
+                self._sleep(self.backoff.delay(i))
 
-            # Update the optimized title in the database
-            self._update_title_in_database(content_id, best_title, best_score)
+            # پاسخ سالم با امتیاز کم نیازی به انتظار ندارد؛ سرعت را rate limiter کلاینت تنظیم می‌کند
 
-            results.append({
-                "content_id": content_id,
-                "original_title": title,
-                "optimized_title": best_title,
-                "seo_score": best_score
-            })
+        REGISTRY.observe("seo_attempts_per_row", attempts, buckets=ATTEMPT_BUCKETS)
+        return best_title, best_score, scored
 
+    def _sleep(self, seconds):
+        """ انتظار بین تلاش‌ها با ثبت زمان آن در metrics """
+        if seconds > 0:
+            REGISTRY.observe("seo_stage_seconds", seconds, stage="sleep")
+            time.sleep(seconds)
+
+    def _finish_cluster(self, content_id, title, best_title, best_score, scored=True):
+        """ ثبت نتیجه برای ردیف نماینده و همه‌ی تکراری‌های آن؛ فقط رکورد ردیف‌های امتیازدهی‌شده برمی‌گردد """
+        records = [self._finish_row(content_id, title, best_title, best_score, scored)]
+        for member_id, member_title, _lang_id in self._cluster_members.pop(content_id, ()):
+            records.append(self._finish_row(member_id, member_title, best_title, best_score, scored))
+        return [record for record in records if record is not None]
+
+    def _finish_row(self, content_id, title, best_title, best_score, scored=True):
+        """ ثبت نتیجه‌ی نهایی یک ردیف در دیتابیس و ساخت رکورد خروجی
+
+        اگر هیچ پیشنهادی امتیازدهی نشده (خطای مدل یا تمام شدن بودجه)، ردیف نه در دیتابیس
+        نوشته می‌شود و نه در checkpoint، تا اجرای افزایشی بعدی دوباره آن را بردارد. برای چنین
+        ردیفی رکوردی هم ساخته نمی‌شود (None)، چون امتیاز اولیه در تاریخچه افت امتیاز به نظر می‌رسید.
+        """
+        if scored:
+            # Update the optimized title in the database
+            self._update_title_in_database(content_id, best_title, best_score)
+            if self.checkpoint is not None:
+                self.checkpoint.record(content_id, title, best_title, best_score)
+            REGISTRY.inc("seo_rows_total")
+            REGISTRY.observe("seo_final_score", best_score, buckets=SCORE_BUCKETS)
             logging.info(f"✅ Final Title for {content_id}: {best_title} (SEO: {best_score})")
+        else:
+            REGISTRY.inc("seo_rows_total", result="unoptimized")
+            logging.warning(f"⚠️ No scored candidate for {content_id}, left for the next run.")
+            return None
+        return {
+            "content_id": content_id,
+            "original_title": title,
+            "optimized_title": best_title,
+            "seo_score": best_score
+        }
 
-        # ذخیره‌سازی نتایج به عنوان JSON
-        self._save_results(results)
+    def _ask_qwen(self, prompt, attempt=1):
+        """ ارسال درخواست به Qwen و دریافت پاسخ (در صورت وجود، ابتدا از کش) """
+        key = None
+        if self.cache is not None:
+            key = self.cache.make_key(self.q_service.BASE_URL, prompt, attempt)
+            cached = self.cache.get(key)
+            if cached is not None:
+                REGISTRY.inc("seo_llm_requests_total", result="cache_hit")
+                return cached
+
+        if not self._take_llm_call():
+            REGISTRY.inc("seo_llm_requests_total", result="over_budget")
+            return None
 
-    def _ask_qwen(self, prompt):
-        """ ارسال درخواست به Qwen و دریافت پاسخ """
         try:
-            self.q_service.send_request(prompt)
-            return self.q_service.get_response()
+            with REGISTRY.timer("seo_stage_seconds", stage="llm_join"):
+                joined = self.q_service.send_request(prompt)
+            if "error" in joined:
+                REGISTRY.inc("seo_llm_requests_total", result="join_error")
+                return None
+            # event_id پاسخ را از stream مشترک session به همین درخواست برمی‌گرداند
+            with REGISTRY.timer("seo_stage_seconds", stage="queue_wait"):
+                response = self.q_service.get_response(joined.get("event_id"))
         except Exception:
             logging.exception("❌ Error in Qwen request")
+            REGISTRY.inc("seo_llm_requests_total", result="exception")
             return None
 
+        # متن‌های ثابت خطا/بی‌پاسخی QService پاسخ مدل نیستند
+        if response == QService.RESPONSE_ERROR_TEXT:
+            REGISTRY.inc("seo_llm_requests_total", result="timeout")
+            return None
+        if response == QService.NO_ANSWER_TEXT:
+            REGISTRY.inc("seo_llm_requests_total", result="no_answer")
+            return None
+        REGISTRY.inc("seo_llm_requests_total", result="ok")
+
+        if key is not None and self._is_parseable(response):
+            self.cache.set(key, response)
+        return response
+
+    def _is_parseable(self, response):
+        try:
+            self._parse_response(response)
+            return True
+        except Exception:
+            return False
+
     def _parse_response(self, raw):
         """ پارس کردن پاسخ دریافتی از Qwen """
         json_start = raw.find('{')
@@ -105,49 +406,145 @@ class SEOService:
             raise ValueError("No JSON found in response.")
         return json.loads(raw[json_start:])
 
+    def _extract_candidates(self, data):
+        """ لیست عناوین پیشنهادی از JSON پاسخ (تکی یا چندتایی) """
+        titles = data.get("optimized_titles")
+        if not isinstance(titles, list):
+            titles = [data.get("optimized_title", "")]
+        return [t.strip() for t in titles if isinstance(t, str) and t.strip()]
+
+    def _extract_keyword(self, data):
+        """ کلمه کلیدی پیشنهادی مدل در حالت Description """
+        keyword = data.get("focus_keyword")
+        return keyword.strip() if isinstance(keyword, str) and keyword.strip() else None
+
     def _build_prompt(self, title, lang_id, last_score=0.0):
         """ ساخت داینامیک prompt برای Qwen بر اساس زبان و امتیاز قبلی """
         if lang_id == 1:  # فارسی
+            if self.candidates > 1:
+                base = (
+                    f"لطفاً {self.candidates} بازنویسی متفاوت از عنوان زیر برای سئو پیشنهاد بده. فقط JSON زیر را خروجی بده:\n"
+                    "{\n"
+                    "  \"original_title\": \"...\",\n"
+                    "  \"optimized_titles\": [\"...\", \"...\"]\n"
+                    "}\n\n"
+                    f"عنوان:\n{title}"
+                )
+            else:
+                base = (
+                    "لطفاً عنوان زیر را برای سئو بازنویسی کن. فقط JSON زیر را خروجی بده:\n"
+                    "{\n"
+                    "  \"original_title\": \"...\",\n"
+                    "  \"optimized_title\": \"...\",\n"
+                    "  \"score\": عددی بین 0 تا 10\n"
+                    "}\n\n"
+                    f"عنوان:\n{title}"
+                )
+            if last_score < self.min_score:
+                base += "\n\n❗️توجه: نسخه قبلی امتیاز کمی داشت. لطفاً عنوانی خیلی متفاوت، جذاب و قابل جستجوی صوتی پیشنهاد بده."
+            return base
+
+        else:  # انگلیسی
+            if self.candidates > 1:
+                base = (
+                    f"Please suggest {self.candidates} different rewrites of the following title to improve SEO. Return ONLY a JSON like:\n"
+                    "{\n"
+                    "  \"original_title\": \"...\",\n"
+                    "  \"optimized_titles\": [\"...\", \"...\"]\n"
+                    "}\n\n"
+                    f"Title:\n{title}"
+                )
+            else:
+                base = (
+                    "Please rewrite the following title to improve SEO. Return ONLY a JSON like:\n"
+                    "{\n"
+                    "  \"original_title\": \"...\",\n"
+                    "  \"optimized_title\": \"...\",\n"
+                    "  \"score\": number between 0 and 10\n"
+                    "}\n\n"
+                    f"Title:\n{title}"
+                )
+            if last_score < self.min_score:
+                base += "\n\n❗ Previous version had low SEO score. Please suggest a significantly different and more engaging SEO title, potentially starting with a question or guide format."
+            return base
+
+    def _build_description_prompt(self, description, lang_id, keyword=None, last_score=0.0):
+        """ prompt ساخت عنوان سئو از روی Description برای محتوای بدون عنوان """
+        description = description.strip()[:DESCRIPTION_PROMPT_CHARS]
+        if lang_id == 1:  # فارسی
+            if self.candidates > 1:
+                task = f"لطفاً {self.candidates} عنوان متفاوت و سئو شده برای محتوایی با توضیحات زیر پیشنهاد بده"
+                titles = "  \"optimized_titles\": [\"...\", \"...\"]\n"
+            else:
+                task = "لطفاً یک عنوان سئو شده برای محتوایی با توضیحات زیر بنویس"
+                titles = "  \"optimized_title\": \"...\"\n"
+            if keyword:
+                task += f" و کلمه کلیدی «{keyword}» را در ابتدای عنوان بیاور"
             base = (
-                "لطفاً عنوان زیر را برای سئو بازنویسی کن. فقط JSON زیر را خروجی بده:\n"
+                f"{task}. عنوان باید بین 30 تا 60 کاراکتر باشد. فقط JSON زیر را خروجی بده:\n"
                 "{\n"
-                "  \"original_title\": \"...\",\n"
-                "  \"optimized_title\": \"...\",\n"
-                "  \"score\": عددی بین 0 تا 10\n"
+                "  \"focus_keyword\": \"...\",\n"
+                f"{titles}"
                 "}\n\n"
-                f"عنوان:\n{title}"
+                f"توضیحات:\n{description}"
             )
             if last_score < self.min_score:
-                base += "\n\n❗️توجه: نسخه قبلی امتیاز کمی داشت. لطفاً عنوانی خیلی متفاوت، جذاب و قابل جستجوی صوتی پیشنهاد بده."
+                base += "\n\n❗️توجه: اگر نسخه قبلی امتیاز کمی داشت، عنوانی جذاب‌تر و قابل جستجوی صوتی پیشنهاد بده."
             return base
 
         else:  # انگلیسی
+            if self.candidates > 1:
+                task = f"Please write {self.candidates} different SEO titles for a page with the following description"
+                titles = "  \"optimized_titles\": [\"...\", \"...\"]\n"
+            else:
+                task = "Please write an SEO title for a page with the following description"
+                titles = "  \"optimized_title\": \"...\"\n"
+            if keyword:
+                task += f", starting with the focus keyword \"{keyword}\""
             base = (
-                "Please rewrite the following title to improve SEO. Return ONLY a JSON like:\n"
+                f"{task}. The title should be 30 to 60 characters long. Return ONLY a JSON like:\n"
                 "{\n"
-                "  \"original_title\": \"...\",\n"
-                "  \"optimized_title\": \"...\",\n"
-                "  \"score\": number between 0 and 10\n"
+                "  \"focus_keyword\": \"...\",\n"
+                f"{titles}"
                 "}\n\n"
-                f"Title:\n{title}"
+                f"Description:\n{description}"
             )
             if last_score < self.min_score:
-                base += "\n\n❗ Previous version had low SEO score. Please suggest a significantly different and more engaging SEO title, potentially starting with a question or guide format."
+                base += "\n\n❗ If a previous version had a low SEO score, make the title more engaging, potentially in a question or guide format."
             return base
 
-    def _save_results(self, results):
-        """ ذخیره نتایج در فایل JSON """
-        ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-        os.makedirs("seo_output", exist_ok=True)
-        path = f"seo_output/seo_results_{ts}.json"
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(results, f, ensure_ascii=False, indent=4)
-        logging.info(f"📁 Saved: {path}")
+    def close(self):
+        """ آزادسازی منابع جانبی سرویس """
+        if self.writer is not None:
+            self.writer.close()
+        if self.cache is not None:
+            self.cache.close()
+        if self.checkpoint is not None:
+            self.checkpoint.close()
+        if self.history is not None:
+            self.history.close()
+        if hasattr(self.q_service, "close"):
+            self.q_service.close()
+
+    def _open_results(self, run_id):
+        """ باز کردن فایل JSONL نتایج این اجرا """
+        return JSONLResultsWriter(f"seo_output/seo_results_{run_id}.jsonl")
+
+    def _save_result(self, run, record):
+        """ ذخیره‌ی افزایشی یک نتیجه در فایل JSONL و تاریخچه‌ی اجراها """
+        run.results.write(record)
+        if self.history is not None:
+            self.history.add(run.run_id, record)
+        run.finished.add(record["content_id"])
 
     def _update_title_in_database(self, content_id, optimized_title, seo_score):
         """ به‌روزرسانی عنوان بهینه‌شده در دیتابیس """
         try:
-            self.db.update_pure_content(content_id, optimized_title)
+            if self.writer is not None:
+                self.writer.add(content_id, optimized_title)
+                return
+            with REGISTRY.timer("seo_stage_seconds", stage="db_write"):
+                self.db.update_pure_content(content_id, optimized_title)
             logging.info(f"✅ Updated content_id {content_id} with optimized title: {optimized_title} (SEO Score: {seo_score})")
         except Exception as e:
             logging.error(f"❌ Error updating content_id {content_id}: {e}")
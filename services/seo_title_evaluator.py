@@ -1,21 +1,103 @@
 import re
 
+PERSIAN_LANG_ID = 1
+
+# عبارت‌های هر زبان؛ عناوین فارسی اغلب کلمات انگلیسی هم دارند، پس پروفایل فارسی شامل انگلیسی هم هست
+_ENGLISH_PHRASES = {
+    "question_words": ["how", "what", "why", "when", "where", "which", "guide", "tutorial"],
+    "special_characters": [":", "-", "?"],
+    "triggers_for_clickbait": ["secret", "revealed", "unveiled", "ultimate", "best", "free"],
+    "voice_search_keywords": ["how to", "what is", "why is", "where can", "who is"],
+    "stopwords": ["the", "of", "and", "a", "an", "to", "in", "on", "for", "with", "at", "by"],
+}
+_PERSIAN_PHRASES = {
+    "question_words": ["چگونه", "چطور", "چرا", "چه کسی", "چه چیزی", "کجا", "کدام", "چه زمانی", "راهنما", "آموزش"],
+    "special_characters": ["؟", "؛"],
+    "triggers_for_clickbait": ["راز", "فاش", "ناگفته", "نهایی", "بهترین", "رایگان"],
+    "voice_search_keywords": ["چگونه", "چطور", "چیست", "چرا", "کجا", "چه کسی", "از کجا"],
+    "stopwords": ["و", "در", "به", "از", "که", "این", "آن", "را", "با", "برای", "یک", "تا", "است", "های"],
+}
+
+_WORD_RE = re.compile(r'\w+')
+# پسوندهای جمع و اضافه که بعد از عبارت فارسی مجازند (راهنمای خرید، آموزش‌های پایتون)
+_PERSIAN_SUFFIX = "(?:\u200c?(?:های|ها|ی))?"
+
+
+def _phrase_regex(phrases, words=()):
+    """ یک regex ترکیبی برای کل لیست با یک بار پیمایش
+
+    phrases مثل any(phrase in text) در هر جای متن پیدا می‌شوند؛ words فقط به صورت کلمه‌ی کامل
+    (تا «کیف» و «بچه» به جای کلمات پرسشی شمرده نشوند).
+    """
+    alternatives = []
+    if words:
+        ordered = sorted(set(words), key=len, reverse=True)
+        alternatives.append(
+            r"(?<!\w)(?:" + "|".join(re.escape(word) for word in ordered) + ")" + _PERSIAN_SUFFIX + r"(?!\w)"
+        )
+    if phrases:
+        ordered = sorted(set(phrases), key=len, reverse=True)
+        alternatives.append("|".join(re.escape(phrase) for phrase in ordered))
+    return re.compile("|".join(alternatives) or "(?!)")
+
+
+class _LanguageProfile:
+    """ regexها و stopwordهای از پیش کامپایل‌شده‌ی یک زبان
+
+    words عبارت‌هایی است که فقط روی مرز کلمه تطبیق داده می‌شوند؛ علائم نگارشی همیشه زیررشته‌اند.
+    """
+    def __init__(self, phrases, words=None):
+        words = words or {}
+        self.question = _phrase_regex(phrases["question_words"], words.get("question_words", ()))
+        self.special = _phrase_regex(phrases["special_characters"] + words.get("special_characters", []))
+        self.clickbait = _phrase_regex(phrases["triggers_for_clickbait"], words.get("triggers_for_clickbait", ()))
+        self.voice = _phrase_regex(phrases["voice_search_keywords"], words.get("voice_search_keywords", ()))
+        self.stopwords = frozenset(phrases["stopwords"] + words.get("stopwords", []))
+
+
 class SEOTitleEvaluator:
     def __init__(self):
-        self.question_words = ["how", "what", "why", "when", "where", "which", "guide", "tutorial"]
-        self.special_characters = [":", "-", "?"]
-        self.triggers_for_clickbait = ["secret", "revealed", "unveiled", "ultimate", "best", "free"]
-        self.voice_search_keywords = ["how to", "what is", "why is", "where can", "who is"]
-    
-    def evaluate(self, optimized_title, focus_keyword):
+        self._default = _LanguageProfile(_ENGLISH_PHRASES)
+        self._profiles = {
+            # عبارت‌های کوتاه فارسی درون کلمات دیگر هم پیدا می‌شوند، پس روی مرز کلمه تطبیق داده می‌شوند
+            PERSIAN_LANG_ID: _LanguageProfile(_ENGLISH_PHRASES, words=_PERSIAN_PHRASES),
+        }
+
+    def _profile(self, lang_id):
+        return self._profiles.get(lang_id, self._default)
+
+    def focus_keyword(self, title, lang_id=None):
+        """ استخراج کلمه کلیدی از عنوان با حذف stopwordهای زبان و تمرکز بر اسم‌ها """
+        stopwords = self._profile(lang_id).stopwords
+        words = [w for w in _WORD_RE.findall(title.lower()) if w not in stopwords]
+
+        # اولویت با کلمات کلیدی معنایی‌تر
+        if len(words) >= 2:
+            return f"{words[0]} {words[1]}"
+        elif words:
+            return words[0]
+        return title.strip().lower()
+
+    def evaluate(self, optimized_title, focus_keyword, lang_id=None):
+        return self._score(optimized_title, focus_keyword.lower(), self._profile(lang_id))
+
+    def evaluate_batch(self, titles, focus_keyword, lang_id=None):
+        """ امتیازدهی یک‌جای چند عنوان پیشنهادی برای یک کلمه کلیدی """
+        keyword = focus_keyword.lower()
+        profile = self._profile(lang_id)
+        return [self._score(title, keyword, profile) for title in titles]
+
+    def _score(self, optimized_title, keyword, profile):
         score = 0.0
-        
+        # متن فقط یک بار نرمال می‌شود
+        lowered = optimized_title.lower()
+
         # بررسی اینکه کلمه کلیدی در ابتدای عنوان باشد
-        if optimized_title.lower().startswith(focus_keyword.lower()):
+        if lowered.startswith(keyword):
             score += 1.5  # اضافه کردن امتیاز برای کلمه کلیدی در ابتدا
 
         # وجود کلمه کلیدی در عنوان
-        if focus_keyword.lower() in optimized_title.lower():
+        if keyword in lowered:
             score += 4.0  # کاهش امتیاز از 5 به 4 برای کلمه کلیدی در عنوان
 
         # طول عنوان مناسب باشد (بیش از 30 کاراکتر و کمتر از 70 کاراکتر)
@@ -27,28 +109,30 @@ class SEOTitleEvaluator:
         elif title_length > 60:
             score -= 1.5  # کسر امتیاز برای عناوین خیلی طولانی
 
-        # اولین حرف بزرگ باشد
-        if optimized_title and optimized_title[0].isupper():
-            score += 1.0  # اضافه کردن امتیاز برای اولین حرف بزرگ
+        # اولین حرف بزرگ باشد؛ در خط‌های بدون حروف بزرگ (مثل فارسی) هر حرفی قابل قبول است
+        if optimized_title:
+            first = optimized_title[0]
+            if first.isupper() or (first.isalpha() and first.lower() == first.upper()):
+                score += 1.0  # اضافه کردن امتیاز برای اولین حرف بزرگ
 
         # وجود کلمات پرسشی در عنوان
-        if any(word in optimized_title.lower() for word in self.question_words):
+        if profile.question.search(lowered):
             score += 2.0  # اضافه کردن امتیاز برای کلمات پرسشی
 
         # بررسی استفاده از علائم نگارشی
-        if any(char in optimized_title for char in self.special_characters):
+        if profile.special.search(optimized_title):
             score += 1.0  # اضافه کردن امتیاز برای علائم نگارشی
 
         # استفاده از کلمات جذاب و ترغیب‌کننده (Clickbait)
-        if any(word in optimized_title.lower() for word in self.triggers_for_clickbait):
+        if profile.clickbait.search(lowered):
             score += 1.5  # اضافه کردن امتیاز برای کلمات جذاب و ترغیب‌کننده
 
         # مناسب بودن برای جستجوهای صوتی
-        if any(phrase in optimized_title.lower() for phrase in self.voice_search_keywords):
+        if profile.voice.search(lowered):
             score += 2.0  # اضافه کردن امتیاز برای جستجوهای صوتی
 
         # جلوگیری از تکرار کلمه کلیدی بیش از حد
-        if optimized_title.lower().count(focus_keyword.lower()) > 2:
+        if lowered.count(keyword) > 2:
             score -= 1.0  # کسر امتیاز برای تکرار زیاد کلمه کلیدی
 
         # محدود کردن امتیاز نهایی بین 0 تا 10
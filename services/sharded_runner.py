@@ -0,0 +1,70 @@
+import logging
+import multiprocessing
+import os
+import socket
+
+def run_worker(make_db, make_service, run_id, worker_index=0, batch_size=10, lease_seconds=900):
+    """ حلقه‌ی یک worker: برداشتن دسته‌ی کار از جدول lease، پردازش و ثبت پایان آن
+
+    اجرای سرویس (فایل نتایج، تاریخچه، metrics) برای کل عمر worker یک بار باز و بسته می‌شود.
+    فقط ردیف‌هایی که کارشان تمام شده complete می‌شوند؛ بقیه پس از انقضای lease دوباره
+    قابل برداشتن‌اند. اگر worker وسط دسته crash کند، worker دیگری همین ردیف‌ها را برمی‌دارد.
+    """
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    db = make_db()
+    db.connect()
+    service = None
+    run = None
+    processed = 0
+    try:
+        # شناسه‌ی یکتای worker (حتی بین ماشین‌ها) برای جدا کردن session hashها
+        service = make_service(db, worker_id=owner.replace(":", "-"))
+        # هر worker فایل نتایج خودش را دارد تا خطوط JSONL چند process در هم نروند
+        run = service.start_run(f"{run_id}_w{worker_index}")
+        while True:
+            rows = db.claim_work(run_id, owner, batch_size=batch_size, lease_seconds=lease_seconds)
+            if not rows:
+                break
+            # process_contents بافر نوشتن را flush کرده؛ حالا پایان کار قابل ثبت است
+            finished = service.process_contents(run, rows)
+            db.complete_work(run_id, owner, [row[0] for row in rows if row[0] in finished])
+            processed += len(finished)
+            left = len(rows) - len(finished)
+            if left:
+                logging.warning(f"⚠️ Worker {owner}: {left} contents left leased for a later attempt")
+            logging.info(f"🧩 Worker {owner}: completed {processed} contents")
+    finally:
+        if run is not None:
+            service.finish_run(run)
+        if service is not None:
+            service.close()
+        db.disconnect()
+    return processed
+
+def _worker_entry(args):
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s:%(asctime)s | %(processName)s | %(message)s')
+    return run_worker(*args)
+
+def run_sharded(make_db, make_service, run_id, workers=2, batch_size=10, lease_seconds=900, seed=True, filters=None):
+    """ اجرای shard‌شده روی چند process؛ هماهنگی فقط از طریق جدول lease در دیتابیس است
+
+    make_db و make_service باید توابع سطح ماژول باشند تا به processها فرستاده شوند.
+    make_service(db, worker_id) باید worker_id را به session hashها اضافه کند تا stream صف
+    هر process فقط eventهای خودش را بخواند.
+    برای اجرای چند ماشینه، یک نمونه با seed=True کار را ثبت می‌کند و بقیه با همان run_id
+    و seed=False فقط worker اجرا می‌کنند. filters فقط روی ثبت اولیه‌ی کارها اعمال می‌شود.
+    """
+    db = make_db()
+    db.connect()
+    try:
+        db.ensure_work_lease_table()
+        if seed:
+            db.seed_work_leases(run_id, **(filters or {}))
+    finally:
+        db.disconnect()
+
+    args = [(make_db, make_service, run_id, index, batch_size, lease_seconds) for index in range(workers)]
+    with multiprocessing.get_context("spawn").Pool(workers) as pool:
+        processed = pool.map(_worker_entry, args)
+    logging.info(f"🧩 Sharded run {run_id}: {sum(processed)} contents processed by {workers} workers")
+    return sum(processed)
@@ -1,17 +1,31 @@
 import pyodbc
+from services.connection_pool import ConnectionPool
+from services.metrics import REGISTRY
+from services.purecontent_query import iter_keyset_pages, purecontent_filters
 
 class SQLServerDatabase:
-    def __init__(self, server, database, username, password):
+    PURECONTENT_COLUMNS = ("Id", "Title", "Description", "ContentCategoryId", "ContentLanguageId")
+    # SQLSTATEهایی که یعنی اتصال قطع شده و باید دوباره ساخته شود
+    CONNECTION_ERROR_STATES = {"08S01", "08001", "08003", "08004", "08007", "HYT00", "HYT01"}
+    # ستون زمان آخرین تغییر محتوا برای فیلتر modified_since؛ در صورت تفاوت schema عوض شود
+    MODIFIED_COLUMN = "ModifiedDate"
+
+    def __init__(self, server, database, username, password, min_connections=1, max_connections=8):
         self.connection_string = (
             f"DRIVER={{ODBC Driver 17 for SQL Server}};"
             f"SERVER={server};DATABASE={database};UID={username};PWD={password}"
         )
-        self.connection = None
+        self.min_connections = min_connections
+        self.max_connections = max_connections
+        self.pool = None
 
     def connect(self):
-        """ایجاد اتصال به دیتابیس"""
+        """ایجاد pool اتصال به دیتابیس"""
         try:
-            self.connection = pyodbc.connect(self.connection_string)
+            self.pool = ConnectionPool(
+                lambda: pyodbc.connect(self.connection_string),
+                min_size=self.min_connections, max_size=self.max_connections
+            )
             print("✅ Database connection established.")
         except Exception as e:
             print(f"❌ Failed to connect to database: {e}")
@@ -19,32 +33,79 @@ class SQLServerDatabase:
 
     def disconnect(self):
         """قطع اتصال از دیتابیس"""
-        if self.connection:
+        if self.pool:
             try:
-                self.connection.close()
+                self.pool.close()
+                self.pool = None
                 print("✅ Database connection closed.")
             except Exception as e:
                 print(f"⚠️ Failed to close connection: {e}")
         else:
             print("⚠️ No active connection to close.")
 
-    def _execute_query(self, query, params=None, fetch=False):
-        """اجرای کوئری با پارامترهای ورودی"""
-        if not self.connection:
+    def lease(self):
+        """گرفتن یک اتصال اختصاصی برای thread جاری (context manager)"""
+        return self.pool.lease()
+
+    def _is_connection_error(self, error):
+        if isinstance(error, (pyodbc.OperationalError, pyodbc.InterfaceError)):
+            return True
+        return bool(error.args) and error.args[0] in self.CONNECTION_ERROR_STATES
+
+    def _run(self, work):
+        """اجرای work(connection) با یک اتصال از pool؛ در قطع اتصال یک بار با اتصال تازه تکرار می‌شود"""
+        for attempt in (1, 2):
+            with self.pool.lease() as connection:
+                try:
+                    return work(connection)
+                except Exception as e:
+                    if not (isinstance(e, pyodbc.Error) and self._is_connection_error(e)):
+                        connection.rollback()
+                        raise
+                    self.pool.mark_broken()
+                    # در lease تو در تو همان اتصال خراب دوباره برمی‌گردد؛ تکرار فایده‌ای ندارد
+                    # و صاحب lease بیرونی باید خطا را ببیند تا اتصال را آزاد کند
+                    if attempt == 2 or self.pool.nested():
+                        raise
+                    print(f"⚠️ Database connection lost, reconnecting: {e}")
+
+    def _execute_query(self, query, params=None, fetch=False, commit=None):
+        """اجرای کوئری با پارامترهای ورودی (commit پیش‌فرض فقط برای کوئری‌های بدون fetch)"""
+        if not self.pool:
             print("⚠️ Cannot execute query, connection is not established.")
             return None
-        
-        try:
-            with self.connection.cursor() as cursor:
+
+        def work(connection):
+            with connection.cursor() as cursor:
                 cursor.execute(query, params or [])
+                rows = cursor.fetchall() if fetch else None
+                if commit if commit is not None else not fetch:
+                    connection.commit()
                 if fetch:
-                    rows = cursor.fetchall()
                     return rows if rows else []
-                else:
-                    self.connection.commit()
+
+        try:
+            return self._run(work)
         except Exception as e:
             print(f"❌ Failed to execute query: {e}")
-            self.connection.rollback()
+            raise
+
+    def _execute_many(self, query, params_list):
+        """اجرای دسته‌ای یک کوئری با executemany و یک commit"""
+        if not self.pool:
+            print("⚠️ Cannot execute query, connection is not established.")
+            return None
+
+        def work(connection):
+            with connection.cursor() as cursor:
+                cursor.fast_executemany = True
+                cursor.executemany(query, params_list)
+                connection.commit()
+
+        try:
+            self._run(work)
+        except Exception as e:
+            print(f"❌ Failed to execute batch query: {e}")
             raise
 
     def select(self, query, params=None):
@@ -81,6 +142,31 @@ class SQLServerDatabase:
         """
         return self.select(query)
 
+    def iter_purecontents(self, columns=PURECONTENT_COLUMNS, page_size=500, start_after=0, limit=None, **filters):
+        """پیمایش صفحه‌به‌صفحه‌ی محتواها با keyset روی Id (بدون نگه‌داشتن کل جدول در حافظه)
+
+        filters همان آرگومان‌های purecontent_filters (services.purecontent_query) است و در خود کوئری اعمال می‌شود؛
+        limit حداکثر تعداد کل ردیف‌های برگشتی است.
+        """
+        unknown = [c for c in columns if c not in self.PURECONTENT_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown TblPureContent columns: {unknown}")
+        # Id همیشه ستون اول است تا کلید صفحه‌ی بعد از آن خوانده شود
+        columns = ["Id"] + [c for c in columns if c != "Id"]
+        clauses, filter_params = purecontent_filters(self.MODIFIED_COLUMN, **filters)
+        query = f"""
+            SELECT TOP (?) {", ".join(columns)}
+            FROM dbo.TblPureContent
+            WHERE {" AND ".join(["Id > ?"] + clauses)}
+            ORDER BY Id
+        """
+
+        def fetch_page(size, last_id):
+            with REGISTRY.timer("seo_stage_seconds", stage="db_read"):
+                return self.select(query, params=[size, last_id, *filter_params])
+
+        return iter_keyset_pages(fetch_page, page_size, start_after, limit)
+
     def update_pure_content(self, content_id, title):
         """به‌روزرسانی عنوان محتوا در دیتابیس"""
         query = """
@@ -89,3 +175,81 @@ class SQLServerDatabase:
             WHERE Id = ?
         """
         self._execute_query(query, params=[title, content_id])
+
+    def update_pure_contents(self, updates):
+        """به‌روزرسانی دسته‌ای عنوان‌ها؛ updates لیستی از (content_id, title) است"""
+        query = """
+            UPDATE dbo.TblPureContent
+            SET Title = ?
+            WHERE Id = ?
+        """
+        self._execute_many(query, [[title, content_id] for content_id, title in updates])
+
+    def ensure_work_lease_table(self):
+        """ساخت جدول lease کار برای اجرای shard‌شده (در صورت نبودن)"""
+        query = """
+            IF OBJECT_ID('dbo.TblTitleWorkLease', 'U') IS NULL
+            CREATE TABLE dbo.TblTitleWorkLease (
+                RunId NVARCHAR(64) NOT NULL,
+                ContentId INT NOT NULL,
+                Owner NVARCHAR(128) NULL,
+                LeaseExpiresAt DATETIME2 NULL,
+                CompletedAt DATETIME2 NULL,
+                CONSTRAINT PK_TblTitleWorkLease PRIMARY KEY (RunId, ContentId)
+            )
+        """
+        self._execute_query(query)
+
+    def seed_work_leases(self, run_id, **filters):
+        """ثبت محتواهای دارای عنوان به عنوان کار این run (ردیف‌های موجود تکرار نمی‌شوند)
+
+        filters همان آرگومان‌های purecontent_filters است.
+        """
+        clauses, filter_params = purecontent_filters(self.MODIFIED_COLUMN, alias="p.", **filters)
+        query = f"""
+            INSERT INTO dbo.TblTitleWorkLease (RunId, ContentId)
+            SELECT ?, p.Id
+            FROM dbo.TblPureContent p
+            WHERE p.Title IS NOT NULL AND p.Title <> ''
+              {"".join(f"AND {clause} " for clause in clauses)}
+              AND NOT EXISTS (
+                  SELECT 1 FROM dbo.TblTitleWorkLease l WITH (UPDLOCK, HOLDLOCK)
+                  WHERE l.RunId = ? AND l.ContentId = p.Id
+              )
+        """
+        self._execute_query(query, params=[run_id, *filter_params, run_id])
+
+    def claim_work(self, run_id, owner, batch_size=10, lease_seconds=900):
+        """برداشتن اتمیک یک دسته کار آزاد یا منقضی‌شده و برگرداندن ردیف‌های محتوای آن"""
+        claim_query = """
+            UPDATE TOP (?) dbo.TblTitleWorkLease WITH (ROWLOCK, READPAST, UPDLOCK)
+            SET Owner = ?, LeaseExpiresAt = DATEADD(SECOND, ?, SYSUTCDATETIME())
+            OUTPUT inserted.ContentId
+            WHERE RunId = ? AND CompletedAt IS NULL
+              AND (LeaseExpiresAt IS NULL OR LeaseExpiresAt < SYSUTCDATETIME())
+        """
+        claimed = self._execute_query(
+            claim_query, params=[batch_size, owner, lease_seconds, run_id], fetch=True, commit=True
+        )
+        if not claimed:
+            return []
+        ids = [row[0] for row in claimed]
+        query = f"""
+            SELECT Id, Title, ContentLanguageId
+            FROM dbo.TblPureContent
+            WHERE Id IN ({", ".join("?" * len(ids))})
+            ORDER BY Id
+        """
+        return self.select(query, params=ids)
+
+    def complete_work(self, run_id, owner, content_ids):
+        """علامت‌گذاری کارهای انجام‌شده؛ فقط اگر lease هنوز متعلق به همین owner باشد"""
+        content_ids = list(content_ids)
+        if not content_ids:
+            return
+        query = f"""
+            UPDATE dbo.TblTitleWorkLease
+            SET CompletedAt = SYSUTCDATETIME(), LeaseExpiresAt = NULL
+            WHERE RunId = ? AND Owner = ? AND ContentId IN ({", ".join("?" * len(content_ids))})
+        """
+        self._execute_query(query, params=[run_id, owner, *content_ids])
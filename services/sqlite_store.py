@@ -0,0 +1,13 @@
+import os
+import sqlite3
+
+
+def connect_sqlite(path):
+    """ اتصال SQLite مشترک برای storeهای محلی (checkpoint، تاریخچه، کش)
+
+    WAL و busy timeout تا workerهای shard‌شده بتوانند هم‌زمان روی همین فایل بنویسند.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
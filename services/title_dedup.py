@@ -0,0 +1,42 @@
+import re
+import unicodedata
+from collections import defaultdict
+
+# پیشوندهایی که خروجی‌های قبلی مدل به عنوان‌ها اضافه کرده‌اند
+_PREFIX_RE = re.compile(r'^\s*(?:final\s+title|optimized\s+title|seo\s+title|title|عنوان(?:\s+نهایی)?)\s*[:：\-–]\s*', re.IGNORECASE)
+_PUNCT_RE = re.compile(r'[^\w\s]+', re.UNICODE)
+_SPACE_RE = re.compile(r'\s+')
+
+
+def normalize_title(title):
+    """ شکل نرمال عنوان برای مقایسه: بدون پیشوند، حروف کوچک، بدون علائم نگارشی """
+    text = unicodedata.normalize("NFKC", title or "")
+    while True:
+        stripped = _PREFIX_RE.sub("", text, count=1)
+        if stripped == text:
+            break
+        text = stripped
+    text = _PUNCT_RE.sub(" ", text.lower())
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+class TitleDeduplicator:
+    """ گروه‌بندی عناوینی که بعد از نرمال‌سازی (پیشوند، حروف، علائم نگارشی) یکسان‌اند
+
+    فقط تکراری‌های دقیق گروه می‌شوند؛ عناوین «تقریباً یکسان» مثل «iPhone 14 Pro» و
+    «iPhone 15 Pro» یا «#1001» و «#1002» محتوای متفاوت‌اند و هر کدام عنوان خودشان را می‌گیرند.
+    """
+    def cluster(self, rows):
+        """ rows: (content_id, title, lang_id)؛ خروجی: لیست (نماینده، [اعضای دیگر]) با همان ساختار """
+        groups = defaultdict(list)
+        for row in rows:
+            # عنوانی که فقط از علائم تشکیل شده شکل نرمال ندارد و با خودش مقایسه می‌شود
+            groups[(row[2], normalize_title(row[1]) or row[1])].append(row)
+
+        clusters = []
+        for members in groups.values():
+            # کوتاه‌ترین عنوان (معمولاً بدون پیشوند اضافه) نماینده‌ی گروه است
+            members.sort(key=lambda row: (len(row[1].strip()), row[0]))
+            clusters.append((members[0], members[1:]))
+        clusters.sort(key=lambda cluster: cluster[0][0])
+        return clusters
@@ -0,0 +1,95 @@
+import logging
+import queue
+import threading
+import time
+from services.metrics import REGISTRY
+
+class TitleWriteBuffer:
+    """ بافر write-behind برای عناوین بهینه‌شده
+
+    عناوین در صف جمع می‌شوند و یک thread پس‌زمینه آن‌ها را دسته‌ای (بر اساس اندازه یا زمان)
+    با یک commit در دیتابیس می‌نویسد تا تأخیر دیتابیس حلقه‌ی LLM را متوقف نکند.
+    """
+    _FLUSH = object()
+    _STOP = object()
+
+    def __init__(self, db, batch_size=100, flush_interval=2.0):
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.failed = 0
+        self._queue = queue.Queue()
+        self._flushed = threading.Condition()
+        self._flush_requests = 0
+        self._flush_done = 0
+        self._thread = threading.Thread(target=self._run, name="title-writer", daemon=True)
+        self._thread.start()
+
+    def add(self, content_id, title):
+        """ افزودن یک عنوان به صف نوشتن """
+        if not self._thread.is_alive():
+            raise RuntimeError("TitleWriteBuffer is closed")
+        self._queue.put((content_id, title))
+
+    def flush(self, timeout=None):
+        """ نوشتن فوری هر چه در بافر هست و منتظر ماندن تا پایان آن """
+        with self._flushed:
+            self._flush_requests += 1
+            ticket = self._flush_requests
+        self._queue.put(self._FLUSH)
+        with self._flushed:
+            return self._flushed.wait_for(
+                lambda: self._flush_done >= ticket or not self._thread.is_alive(), timeout
+            )
+
+    def close(self):
+        """ نوشتن باقی‌مانده‌ی بافر و توقف thread نویسنده """
+        if self._thread.is_alive():
+            self._queue.put(self._STOP)
+            self._thread.join()
+        logging.info(f"💾 Title writer: {self.written} written, {self.failed} failed")
+
+    def _run(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is self._STOP:
+                self._write(batch)
+                with self._flushed:
+                    self._flush_done = self._flush_requests
+                    self._flushed.notify_all()
+                return
+            if item is self._FLUSH:
+                self._write(batch)
+                batch, deadline = [], None
+                with self._flushed:
+                    self._flush_done += 1
+                    self._flushed.notify_all()
+                continue
+            if item is not None:
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            if len(batch) >= self.batch_size or (batch and time.monotonic() >= deadline):
+                self._write(batch)
+                batch, deadline = [], None
+
+    def _write(self, batch):
+        if not batch:
+            return
+        try:
+            with REGISTRY.timer("seo_stage_seconds", stage="db_write"):
+                self.db.update_pure_contents(batch)
+            self.written += len(batch)
+            logging.info(f"💾 Flushed {len(batch)} optimized titles to database")
+        except Exception as e:
+            self.failed += len(batch)
+            ids = [content_id for content_id, _ in batch]
+            logging.error(f"❌ Error flushing titles for content_ids {ids}: {e}")